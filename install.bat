@@ -3,4 +3,5 @@ pip install sphinx-autodoc-typehints
 https://www.lfd.uci.edu/~gohlke/pythonlibs/#curses
 pip install pytube
 pip install flask
-pip install flask-socketio
\ No newline at end of file
+pip install flask-socketio
+pip install numpy
\ No newline at end of file
@@ -1,10 +1,52 @@
 import os
+import sys
+import hashlib
 from filebuffer import ReadBuffer, WriteBuffer
-from typing import List
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
 import unittest
 import shutil
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
+from codec import RawData, isCompressible, SAMPLESIZE
 from log import getLog
+from manifest import Entry, Manifest, STREAM
+
+STREAMSIZE = 2**64-1
+PIECEHEADERSIZE = 4
+EXTENDED = 0x8000
+BATCHFILES = 256
+STORED = 0x01
+REFERENCE = 0x02
+DELETED = 0x04
+COPY = 0
+LINK = 1
+
+
+class Member:
+	"""
+	Member describes where a file is located in the archived data.
+
+	Attributes:
+		name: path of the file within the archive
+		start: position of the header of the file in the archived data
+		end: position after the last byte of the file in the archived data
+		flags: flags of the header
+
+	Parameters:
+		name: path of the file within the archive
+		start: position of the header of the file in the archived data
+		end: position after the last byte of the file in the archived data
+		flags: flags of the header
+	"""
+	def __init__(self, name: str, start: int, end: int=-1, flags: int=0):
+		self.name: str = name
+		self.start: int = start
+		self.end: int = end
+		self.flags: int = flags
+
 
 class Archiver:
 	"""
@@ -12,47 +54,84 @@ class Archiver:
 
 	Attributes:
 		readBuffer: readBuffer
-		files: list of files and folders that need to be processed
+		manifest: files that need to be processed
 		file: path to actual file
 		delete: status if the file should be deleted after it is processed
 		readSize: number of bytes read in one call
 		folder: folder
+		name: name of the file read from stdin
+		streamed: status if the actual file has an unknown size and is archived in pieces
+		offset: number of bytes returned by read
+		members: archived files in the order they were read
+		member: actual file
+		estimate: status if files are checked for compressibility
+		dedup: status if files with the content of an archived file are replaced by a reference
+		hashes: names of archived files by size and SHA-256 digest
+		sizes: sizes of the files in hashes except 0
+		inodes: names of archived files with more than one hard link by device and inode
+		hash: hash of the data of the actual file read so far, None if it is not needed
+		entry: actual file as found by the manifest
+		records: size, mtime and SHA-256 hex digest of every file of the tree by name, None if not incremental
+		previous: records of the previous archive, None if all files are archived
+		deleted: names of files of previous that are not in the tree anymore, None until the tree is walked
 
 	Parameters:
-		folder: path to file/folder
+		folder: path to file/folder or STREAM to archive stdin
 		delete: status if the file should be deleted after it is processed
+		name: name of the file read from stdin
+		estimate: status if files are checked for compressibility
+		manifest: manifest of folder, a new one if None
+		dedup: status if files with the content of an archived file are replaced by a reference
+		incremental: status if records are collected
+		previous: records of the previous archive, files that did not change since are skipped
+		readsize: number of bytes read in one call
 
 	| **Pre:**
-	|	os.path.isfile(folder) or os.path.isdir(folder)
+	|	os.path.isfile(folder) or os.path.isdir(folder) or folder == STREAM
+	|	manifest is None or no file of manifest is taken yet
+	|	readsize > 0
 
 	| **Post:**
 	|	self.readBuffer = None
 	|	self.file = ""
-	|	self.readSize = 1024
-	|	self.files contains files/folders in folder
+	|	self.readSize = readsize
+	|	self.offset = 0
+	|	self.members = []
+
+	Note:
+		A file read from stdin is announced with the size STREAMSIZE.
+		Its content follows in pieces, each prefixed by its 4 byte length, and ends with an empty piece.
+		If estimate is set, files whose first SAMPLESIZE bytes do not compress get the flag STORED
+		and their content is returned as RawData, so it is not compressed.
+		If dedup is set, a hard link of an archived file and a file with the size and digest of an archived file
+		get the flag REFERENCE. Their content is the kind of the reference, LINK or COPY, followed by the name of the
+		archived file. Only files of a size that was archived before are hashed before they are read.
+		If previous is set, files with the size and mtime of their record are skipped, as are files with a new mtime
+		whose digest did not change. After the last file, every file of previous that is gone gets a header
+		with the flag DELETED and size 0. previous implies incremental.
 	"""
-	def __init__(self, folder: str, delete: bool=False):
+	def __init__(self, folder: str, delete: bool=False, name: str="stdin", estimate: bool=False, manifest: Manifest=None, dedup: bool=False, incremental: bool=False, previous: Dict[str, List]=None, readsize: int=64*1024):
 		self.readBuffer: ReadBuffer = None
-		self.files: List[str] = []
-		self.folder:str = ""
-		index = folder.rfind(os.sep)
-		if index != -1:
-			index += 1
-			self.folder = folder[:index]
-		if os.path.isfile(folder):
-			if index != -1:
-				self.files = [folder[index:]]
-			else:
-				self.files = [folder]
-		elif os.path.isdir(folder):
-			files = os.listdir(folder)
-			for file in files:
-				file = folder+os.sep+file
-				file = file[len(self.folder):]
-				self.files.append(file)
+		self.manifest: Manifest = manifest if manifest is not None else Manifest(folder)
+		self.folder:str = self.manifest.folder
+		self.name: str = name
+		self.streamed: bool = False
+		self.offset: int = 0
+		self.members: List[Member] = []
+		self.member: Member = None
+		self.estimate: bool = estimate
+		self.dedup: bool = dedup
+		self.hashes: Dict[Tuple[int, bytes], str] = {}
+		self.sizes: Set[int] = set()
+		self.inodes: Dict[Tuple[int, int], str] = {}
+		self.hash = None
+		self.entry: Optional[Entry] = None
+		self.records: Optional[Dict[str, List]] = {} if incremental or previous is not None else None
+		self.previous: Dict[str, List] = previous if previous is not None else {}
+		self.deleted: Optional[Deque[str]] = None
 		self.file: str = ""
 		self.delete: bool = delete
-		self.readSize: int = 1024
+		self.readSize: int = readsize
 
 	def read(self) -> bytearray:
 		"""
@@ -61,50 +140,248 @@ class Archiver:
 		Parameters:
 
 		Returns:
-			read bytes
+			read bytes, empty if all files are read
 
 		| **Modifies:**
 		|	self.readBuffer
-		|	self.files
+		|	self.manifest
+		|	self.offset
+		|	self.members
 		"""
 		ba = bytearray()
-		if self.readBuffer is None:
-			while True:
-				if len(self.files) == 0:
+		while len(ba) == 0:
+			if self.readBuffer is None:
+				ba = self.next()
+				if len(ba) == 0:
 					break
-				else:
-					file = self.files.pop(0)
-					file = self.folder+file
-					if os.path.isdir(file):
-						folder = file
-						files = os.listdir(folder)
-						for file in files:
-							file = folder+os.sep+file
-							self.files.append(file)
-					elif os.path.isfile(file):
-						getLog().info("archive "+file)
-						self.readBuffer = ReadBuffer(file)
-						self.file = file
-						file = file[len(self.folder):]
-						length = len(file)
-						ba.append(length >> 8)
-						ba.append(length & 255)
-						for c in file:
-							ba.append(ord(c))
-						filesize = os.stat(self.file).st_size
-						for i in range(8):
-							ba.append((filesize >> (8*(8-1-i))) & 255)
-						break
-		else:
-			ba = self.readBuffer.read(self.readSize)
-			if len(ba) == 0:
-				self.readBuffer.close()
-				self.readBuffer = None
-				if self.delete:
-					os.remove(self.file)
-				ba = self.read()
+			else:
+				ba = self.readBuffer.read(self.readSize)
+				if self.hash is not None:
+					self.hash.update(ba)
+				if self.member.flags & STORED and len(ba) > 0:
+					ba = RawData(ba)
+				if self.streamed:
+					length = len(ba)
+					ba[0:0] = length.to_bytes(PIECEHEADERSIZE, "big")
+					if length == 0:
+						self.closeFile(len(ba))
+				elif len(ba) == 0:
+					self.closeFile(0)
+		self.offset += len(ba)
+		return ba
+
+	def next(self) -> bytearray:
+		"""
+		Opens the next file.
+
+		Returns:
+			header of the file, empty if all files are read
+
+		| **Modifies:**
+		|	self.readBuffer
+		|	self.manifest
+		|	self.member
+		|	self.records
+		"""
+		while True:
+			entry = self.manifest.next()
+			if entry is None:
+				return self.deletion()
+			if entry.name == STREAM:
+				getLog().info("archive stdin as "+self.name)
+				self.readBuffer = ReadBuffer(sys.stdin.buffer)
+				self.file = STREAM
+				self.streamed = True
+				self.member = Member(self.name, self.offset)
+				return self.header(self.name, STREAMSIZE)
+			self.file = self.folder+entry.name
+			if self.records is None or not self.unchanged(entry):
+				break
+		file = self.file
+		if self.dedup:
+			reference = self.reference(entry)
+			if len(reference) > 0:
+				return reference
+		self.entry = entry
+		if self.dedup or self.records is not None:
+			self.hash = hashlib.sha256()
+		getLog().info("archive "+file)
+		self.readBuffer = ReadBuffer(file)
+		self.member = Member(entry.name, self.offset)
+		if self.estimate:
+			sample = self.readBuffer.read(SAMPLESIZE)
+			self.readBuffer.seek(0)
+			if len(sample) == SAMPLESIZE and not isCompressible(sample):
+				getLog().info("store "+file+" without compression")
+				self.member.flags |= STORED
+		return self.header(self.member.name, self.readBuffer.filesize, self.member.flags)
+
+	def unchanged(self, entry: Entry) -> bool:
+		"""
+		Checks if a file did not change since the previous archive.
+
+		Parameters:
+			entry: file
+
+		Returns:
+			True if the file is skipped
+
+		| **Modifies:**
+		|	self.records
+		"""
+		record = self.previous.get(entry.name)
+		if record is None or record[0] != entry.size:
+			return False
+		if record[1] != entry.mtime:
+			if hashFile(self.file) != (entry.size, bytes.fromhex(record[2])):
+				return False
+			record = [entry.size, entry.mtime, record[2]]
+		self.records[entry.name] = record
+		return True
+
+	def deletion(self) -> bytearray:
+		"""
+		Creates the header of the next file of the previous archive that is gone.
+
+		Returns:
+			header of the deleted file, empty if there is none left
+
+		| **Modifies:**
+		|	self.deleted
+		|	self.members
+		"""
+		if self.deleted is None:
+			self.deleted = deque(name for name in self.previous if name not in self.records) if self.records is not None else deque()
+		if len(self.deleted) == 0:
+			return bytearray()
+		name = self.deleted.popleft()
+		getLog().info("archive deletion of "+name)
+		ba = self.header(name, 0, DELETED)
+		self.members.append(Member(name, self.offset, self.offset+len(ba), DELETED))
+		return ba
+
+	def reference(self, entry: Entry) -> bytearray:
+		"""
+		Creates a reference if the file is a hard link or a copy of an archived file.
+
+		Parameters:
+			entry: file
+
+		Returns:
+			header and content of the reference, empty if the file has to be archived
+
+		| **Modifies:**
+		|	self.members
+		|	self.records
+		"""
+		kind = LINK
+		target = self.inodes.get(entry.inode) if entry.inode is not None else None
+		if target is None and entry.size in self.sizes:
+			kind = COPY
+			target = self.hashes.get(hashFile(self.file))
+		if target is None:
+			return bytearray()
+		getLog().info("archive "+self.file+" as reference to "+target)
+		content = bytes((kind,))+target.encode("latin-1")
+		ba = self.header(entry.name, len(content), REFERENCE)+content
+		self.members.append(Member(entry.name, self.offset, self.offset+len(ba), REFERENCE))
+		if self.records is not None:
+			self.records[entry.name] = [entry.size, entry.mtime, self.records[target][2]]
+		if self.delete:
+			os.remove(self.file)
 		return ba
 
+	def closeFile(self, pending: int):
+		"""
+		Closes the actual file.
+
+		Parameters:
+			pending: number of bytes of the file that are not yet returned by read
+
+		| **Modifies:**
+		|	self.readBuffer
+		|	self.streamed
+		|	self.members
+		|	self.hashes
+		|	self.sizes
+		|	self.inodes
+		|	self.records
+		"""
+		if self.hash is not None:
+			self.hashes[(self.readBuffer.pos, self.hash.digest())] = self.member.name
+			if self.readBuffer.pos > 0:
+				self.sizes.add(self.readBuffer.pos)
+			if self.records is not None:
+				self.records[self.member.name] = [self.readBuffer.pos, self.entry.mtime, self.hash.hexdigest()]
+			self.hash = None
+		if self.entry is not None:
+			if self.entry.inode is not None:
+				self.inodes[self.entry.inode] = self.member.name
+			self.entry = None
+		self.readBuffer.close()
+		self.readBuffer = None
+		self.streamed = False
+		if self.delete and self.file != STREAM:
+			os.remove(self.file)
+		self.member.end = self.offset+pending
+		self.members.append(self.member)
+		self.member = None
+
+	def header(self, file: str, filesize: int, flags: int=0) -> bytearray:
+		"""
+		Creates the header of a file.
+
+		Parameters:
+			file: path of the file within the archive
+			filesize: size of the file
+			flags: flags of the file
+
+		Returns:
+			header bytes
+
+		| **Pre:**
+		|	len(file) < EXTENDED
+		|	filesize >= 0
+		|	filesize <= STREAMSIZE
+		|	flags >= 0
+		|	flags < 256
+
+		Note:
+			If flags are set, EXTENDED is added to the length of the name and the flags follow the name.
+		"""
+		ba = bytearray()
+		length = len(file)
+		if flags != 0:
+			length |= EXTENDED
+		ba.append(length >> 8)
+		ba.append(length & 255)
+		ba += file.encode("latin-1")
+		if flags != 0:
+			ba.append(flags)
+		ba += filesize.to_bytes(8, "big")
+		return ba
+
+
+def hashFile(file: str) -> Tuple[int, bytes]:
+	"""
+	Hashes a file.
+
+	Parameters:
+		file: path to file
+
+	Returns:
+		size and SHA-256 digest of the file
+	"""
+	hash = hashlib.sha256()
+	readBuffer = ReadBuffer(file)
+	while True:
+		ba = readBuffer.read(readBuffer.bufferSize)
+		if len(ba) == 0:
+			break
+		hash.update(ba)
+	readBuffer.close()
+	return readBuffer.pos, hash.digest()
+
 
 class Dearchiver:
 	"""
@@ -113,29 +390,79 @@ class Dearchiver:
 	Attributes:
 		writeBuffer: writeBuffer
 		folder: folder to extract to
-		filesize: remaining bytes that belong to the actual file
+		filesize: remaining bytes that belong to the actual file or piece
 		buffer: buffer for unprocessed data
+		bufferSize: size of the buffer of each writeBuffer
+		bytesWritten: number of bytes written by closed writeBuffers
+		flushes: number of flushes of closed writeBuffers
+		streamed: status if the actual file is archived in pieces
+		output: writeBuffer all files are written to if folder is STREAM
+		folders: folders that are already created
+		written: paths of the files written so far within the archive
+		unresolved: paths, kinds and targets of references whose target was not written
+		renames: paths within the archive mapped to the paths the files are written to instead
+		flags: flags of the header of the actual file
+		path: path of the actual file if it is written by a writer thread or is a reference
+		executor: pool of writer threads, None if files are written by the calling thread
+		batch: paths and contents of files that are not handed to a writer thread yet
+		batchSize: total size of the files in batch
+		pending: batches handed to writer threads that are not collected yet
+		slots: limits the number of batches handed to writer threads at the same time
 
 	Parameters:
-		folder: path to folder
+		folder: path to folder or STREAM to write the content of all files to stdout
+		buffersize: size of the buffer of each writeBuffer
+		writers: number of writer threads, 0 writes in the calling thread
+		maxpending: maximum number of batches handed to writer threads at the same time
 
 	| **Pre:**
-	|	os.path.isdir(folder)
+	|	buffersize > 0
+	|	writers >= 0
+	|	maxpending > 0
 
 	| **Post:**
 	|	self.writeBuffer = None
 	|	self.buffer = None
 	|	self.filesize = 0
 	|	self.folder = folder
+	|	self.bytesWritten = 0
+	|	self.flushes = 0
+	|	self.streamed = False
+
+	Note:
+		With writers, files up to buffersize are collected in memory and handed to writer threads in batches of up to
+		BATCHFILES files or buffersize bytes, so the syscalls of many small files overlap.
+		Every writer thread has one file open at a time, and at most maxpending batches wait in memory.
+		Larger files and stdout are written by the calling thread.
+		Errors of writer threads are raised by a later write or by close.
+		References are restored from the already written file they point to, see restore.
+		Files with the flag DELETED are removed, so an incremental archive can be applied to its restored base.
 	"""
-	def __init__(self, folder: str):
-		self.writeBuffer: WriteBuffer = None
+	def __init__(self, folder: str, buffersize: int=4*1024*1024, writers: int=0, maxpending: int=16):
+		self.writeBuffer: Union[WriteBuffer, io.BytesIO] = None
 		self.filesize: int = 0
 		self.buffer: bytearray = None
+		self.bufferSize: int = buffersize
+		self.bytesWritten: int = 0
+		self.flushes: int = 0
+		self.streamed: bool = False
 		self.folder: str = folder
-		index = folder.rfind(os.sep)
-		if index != -1:
-			self.folder = folder[:index]
+		self.output: WriteBuffer = None
+		self.folders: Set[str] = set()
+		self.written: Set[str] = set()
+		self.unresolved: List[Tuple[str, int, str]] = []
+		self.renames: Dict[str, str] = {}
+		self.flags: int = 0
+		self.path: str = ""
+		self.executor: ThreadPoolExecutor = None
+		self.batch: List[Tuple[str, bytes]] = []
+		self.batchSize: int = 0
+		self.pending: List[Future] = []
+		self.slots: threading.BoundedSemaphore = threading.BoundedSemaphore(maxpending)
+		if folder == STREAM:
+			self.output = WriteBuffer(sys.stdout.buffer, buffersize)
+		elif writers > 0:
+			self.executor = ThreadPoolExecutor(writers, "writer")
 
 	def write(self, data: bytearray):
 		"""
@@ -150,47 +477,360 @@ class Dearchiver:
 		|	self.buffer
 		|	self.filesize
 		|	self.writeBuffer
+		|	self.bytesWritten
+		|	self.flushes
+		|	self.streamed
+
+		Note:
+			The data is walked with an offset, so one call can hold any number of files.
+			Only an incomplete header or piece length is kept for the next call.
 		"""
 		if self.buffer is not None:
 			data = self.buffer+data
 			self.buffer = None
+		offset = 0
 		datalength = len(data)
-		if self.writeBuffer is None:
-			if datalength >= 2:
-				length = ((data[0]) << 8)+data[1]
-				if datalength >= 2+length:
-					file = ""
-					for i in range(length):
-						file += chr(data[2+i])
-					self.filesize = 0
-					if datalength >= 2+length+8:
-						for i in range(8):
-							self.filesize += (data[2+length+i]) << (8*(8-1-i))
-						getLog().info("dearchive "+self.folder+os.sep+file)
-						self.writeBuffer = WriteBuffer(self.folder+os.sep+file)
-						maxlength = min(datalength-(2+length+8), self.filesize)
-						ba = bytearray()
-						for i in range(maxlength):
-							ba.append(data[2+length+8+i])
-						self.writeBuffer.write(ba)
-						self.filesize -= maxlength
-					else:
-						self.buffer = data
-				else:
-					self.buffer = data
+		while offset < datalength:
+			if self.writeBuffer is None:
+				headerend = self.parseHeader(data, offset)
+				if headerend == -1:
+					break
+				offset = headerend
+			elif self.streamed:
+				if self.filesize == 0:
+					if datalength-offset < PIECEHEADERSIZE:
+						break
+					self.filesize = int.from_bytes(data[offset:offset+PIECEHEADERSIZE], "big")
+					offset += PIECEHEADERSIZE
+					if self.filesize == 0:
+						self.streamed = False
+						self.closeFile()
+						continue
+				length = min(datalength-offset, self.filesize)
+				self.writeBuffer.write(data[offset:offset+length])
+				self.filesize -= length
+				offset += length
 			else:
-				self.buffer = data
+				length = min(datalength-offset, self.filesize)
+				self.writeBuffer.write(data[offset:offset+length])
+				self.filesize -= length
+				offset += length
+				if self.filesize == 0:
+					self.closeFile()
+		if offset < datalength:
+			self.buffer = bytearray(data[offset:])
+
+	def parseHeader(self, data: bytearray, offset: int) -> int:
+		"""
+		Reads the header of a file and opens it.
+
+		Parameters:
+			data: data to be processed
+			offset: position of the header in data
+
+		Returns:
+			position after the header, -1 if the header is incomplete
+
+		| **Modifies:**
+		|	self.filesize
+		|	self.flags
+		|	self.writeBuffer
+		|	self.streamed
+
+		Note:
+			Files of size 0 are closed right away, deleted files are removed.
+			The content of a reference is collected in an io.BytesIO.
+		"""
+		datalength = len(data)
+		if datalength-offset < 2:
+			return -1
+		length = (data[offset] << 8)+data[offset+1]
+		flagsize = 0
+		if length & EXTENDED:
+			length &= ~EXTENDED
+			flagsize = 1
+		start = offset+2
+		end = start+length+flagsize+8
+		if datalength < end:
+			return -1
+		file = bytes(data[start:start+length]).decode("latin-1")
+		file = self.renames.get(file, file)
+		self.flags = data[start+length] if flagsize else 0
+		self.filesize = int.from_bytes(data[end-8:end], "big")
+		if self.flags & DELETED:
+			self.remove(file)
+			return end
+		if self.flags & REFERENCE:
+			self.path = file
+			self.writeBuffer = io.BytesIO()
 		else:
-			length = min(datalength, self.filesize)
-			ba = bytearray()
-			for i in range(length):
-				ba.append(data[i])
-			self.writeBuffer.write(ba)
-			self.filesize -= length
-			if self.filesize == 0:
+			self.open(file)
+		if self.filesize == STREAMSIZE:
+			self.streamed = True
+			self.filesize = 0
+		elif self.filesize == 0:
+			self.closeFile()
+		return end
+
+	def open(self, file: str):
+		"""
+		Opens the writeBuffer of a file.
+
+		Parameters:
+			file: path of the file within the archive
+
+		| **Modifies:**
+		|	self.writeBuffer
+		|	self.path
+		|	self.written
+
+		Note:
+			The writeBuffer of a file for a writer thread is an io.BytesIO.
+			Other files get the size of their header reserved on disk, a full disk fails before their data is decoded.
+		"""
+		self.written.add(file)
+		if self.output is not None:
+			getLog().info("dearchive "+file+" to stdout")
+			self.writeBuffer = self.output
+		elif self.executor is not None and self.filesize <= self.bufferSize:
+			getLog().info("dearchive "+self.folder+os.sep+file)
+			self.path = self.folder+os.sep+file
+			self.writeBuffer = io.BytesIO()
+		else:
+			getLog().info("dearchive "+self.folder+os.sep+file)
+			preallocate = self.filesize if self.filesize != STREAMSIZE else 0
+			self.writeBuffer = WriteBuffer(self.folder+os.sep+file, self.bufferSize, folders=self.folders, preallocate=preallocate)
+
+	def closeFile(self):
+		"""
+		Closes the writeBuffer of the actual file.
+
+		| **Pre:**
+		|	self.writeBuffer is not None
+
+		| **Post:**
+		|	self.writeBuffer is None
+
+		| **Modifies:**
+		|	self.writeBuffer
+		|	self.bytesWritten
+		|	self.flushes
+		|	self.batch
+		"""
+		if self.flags & REFERENCE:
+			content = self.writeBuffer.getvalue()
+			self.restore(self.path, content[0], content[1:].decode("latin-1"))
+		elif isinstance(self.writeBuffer, io.BytesIO):
+			data = self.writeBuffer.getvalue()
+			self.batch.append((self.path, data))
+			self.batchSize += len(data)
+			if len(self.batch) >= BATCHFILES or self.batchSize >= self.bufferSize:
+				self.submit()
+		elif self.writeBuffer is not self.output:
+			self.writeBuffer.close()
+			self.bytesWritten += self.writeBuffer.bytesWritten
+			self.flushes += self.writeBuffer.flushes
+		self.writeBuffer = None
+		self.flags = 0
+
+	def remove(self, file: str):
+		"""
+		Removes a file that was deleted from the archived tree.
+
+		Parameters:
+			file: path of the file within the archive
+
+		| **Modifies:**
+		|	self.written
+		|	self.pending
+
+		Note:
+			Nothing is removed if files are written to stdout.
+		"""
+		self.written.discard(file)
+		if self.output is not None:
+			return
+		if self.executor is not None:
+			self.submit()
+			self.collect(True)
+		path = self.folder+os.sep+file
+		if os.path.lexists(path):
+			getLog().info("remove "+path)
+			os.remove(path)
+
+	def restore(self, file: str, kind: int, target: str):
+		"""
+		Restores a reference by linking or copying a written file.
+
+		Parameters:
+			file: path of the reference within the archive
+			kind: LINK or COPY
+			target: path of the referenced file within the archive
+
+		| **Modifies:**
+		|	self.unresolved
+		|	self.written
+		|	self.pending
+
+		Note:
+			References to files that are not written yet are added to self.unresolved.
+			A link falls back to a copy if the filesystem does not support hard links.
+			Raises ValueError if files are written to stdout.
+		"""
+		if self.output is not None:
+			raise ValueError("the reference "+file+" can not be written to stdout")
+		if target not in self.written:
+			self.unresolved.append((file, kind, target))
+			return
+		if self.executor is not None:
+			self.submit()
+			self.collect(True)
+		getLog().info("dearchive "+self.folder+os.sep+file+" from "+target)
+		self.written.add(file)
+		source = self.folder+os.sep+target
+		destination = self.folder+os.sep+file
+		folder = os.path.dirname(destination)
+		if folder not in self.folders:
+			os.makedirs(folder, exist_ok=True)
+			self.folders.add(folder)
+		if os.path.lexists(destination):
+			os.remove(destination)
+		if kind == LINK:
+			try:
+				os.link(source, destination)
+				return
+			except OSError:
+				pass
+		shutil.copyfile(source, destination)
+
+	def submit(self):
+		"""
+		Hands the batch to a writer thread, waiting while maxpending batches are pending.
+
+		| **Modifies:**
+		|	self.batch
+		|	self.batchSize
+		|	self.pending
+		|	self.bytesWritten
+		|	self.flushes
+		"""
+		if len(self.batch) == 0:
+			return
+		batch = self.batch
+		self.batch = []
+		self.batchSize = 0
+		self.slots.acquire()
+		try:
+			self.pending.append(self.executor.submit(self.writeFiles, batch))
+		except BaseException:
+			self.slots.release()
+			raise
+		self.collect(False)
+
+	def writeFiles(self, batch: List[Tuple[str, bytes]]) -> Tuple[int, int]:
+		"""
+		Writes files one after another, runs in a writer thread.
+
+		Parameters:
+			batch: paths and contents of the files
+
+		Returns:
+			bytes written and number of flushes
+		"""
+		bytesWritten = 0
+		flushes = 0
+		try:
+			for path, data in batch:
+				writeBuffer = WriteBuffer(path, self.bufferSize, folders=self.folders)
+				writeBuffer.write(data)
+				writeBuffer.close()
+				bytesWritten += writeBuffer.bytesWritten
+				flushes += writeBuffer.flushes
+			return bytesWritten, flushes
+		finally:
+			self.slots.release()
+
+	def collect(self, wait: bool):
+		"""
+		Collects the results of files written by writer threads.
+
+		Parameters:
+			wait: status if all pending files are waited for
+
+		| **Modifies:**
+		|	self.pending
+		|	self.bytesWritten
+		|	self.flushes
+
+		Note:
+			Raises the exception of a failed writer thread.
+		"""
+		pending = []
+		for future in self.pending:
+			if wait or future.done():
+				bytesWritten, flushes = future.result()
+				self.bytesWritten += bytesWritten
+				self.flushes += flushes
+			else:
+				pending.append(future)
+		self.pending = pending
+
+	def close(self, padded: bool=False):
+		"""
+		Closes the actual file, waits for the writer threads and flushes stdout.
+
+		Parameters:
+			padded: status if the data ends with padding that may decompress to random bytes, like LEGACY streams
+
+		| **Modifies:**
+		|	self.writeBuffer
+		|	self.output
+		|	self.executor
+		|	self.unresolved
+
+		Note:
+			Raises ValueError after cleaning up if the data ended inside a header or a file,
+			which happens with a wrong password or damaged data. If padded, an incomplete header is dropped.
+			References that came before their target are restored once all files are written,
+			ValueError is raised if a target is still missing.
+		"""
+		truncated = (self.buffer is not None and len(self.buffer) > 0 and not padded) or (self.writeBuffer is not None and (self.filesize > 0 or self.streamed))
+		if self.writeBuffer is not None:
+			if not truncated:
+				self.closeFile()
+			elif isinstance(self.writeBuffer, WriteBuffer) and self.writeBuffer is not self.output:
 				self.writeBuffer.close()
-				self.writeBuffer = None
-				self.write(data[length:])
+			self.writeBuffer = None
+		if self.executor is not None:
+			try:
+				self.submit()
+				self.collect(True)
+			finally:
+				self.executor.shutdown()
+				self.executor = None
+		unresolved = [] if truncated else self.unresolved
+		self.unresolved = []
+		restored = True
+		while restored:
+			restored = False
+			missing = []
+			for file, kind, target in unresolved:
+				if target in self.written:
+					self.restore(file, kind, target)
+					restored = True
+				else:
+					missing.append((file, kind, target))
+			unresolved = missing
+		self.unresolved = unresolved
+		if self.output is not None:
+			self.output.close()
+			self.bytesWritten += self.output.bytesWritten
+			self.flushes += self.output.flushes
+			self.output = None
+		if truncated:
+			raise ValueError("wrong password or damaged data, the archive ends inside a file")
+		if len(self.unresolved) > 0:
+			raise ValueError("the target of the reference "+self.unresolved[0][0]+" is not in the archive")
 
 class ArchiverUnitTest(unittest.TestCase):
 	def setUp(self):
@@ -288,4 +928,237 @@ class ArchiverUnitTest(unittest.TestCase):
 			self.assertTrue(ba1[i] == ba2[i])
 		fin1.close()
 		fin2.close()
+		shutil.rmtree(testfolder)
+
+	def test_members(self):
+		testfolder = "../test"
+		os.makedirs("../test/folder")
+		contents = [b"first file", b"", b"third file"]
+		for i in range(len(contents)):
+			fout = open("../test/folder/test"+str(i)+".txt", "wb")
+			fout.write(contents[i])
+			fout.close()
+		archiver = Archiver("../test/folder")
+		ba = bytearray()
+		while True:
+			data = archiver.read()
+			if len(data) == 0:
+				break
+			ba += data
+		dearchiver = Dearchiver("../test/output")
+		dearchiver.write(ba)
+		dearchiver.close()
+		for i in range(len(contents)):
+			fin = open("../test/output/folder/test"+str(i)+".txt", "rb")
+			self.assertTrue(fin.read() == contents[i])
+			fin.close()
+		shutil.rmtree(testfolder)
+
+	def test_stored(self):
+		testfolder = "../test"
+		os.makedirs("../test/folder")
+		contents = [b"text "*SAMPLESIZE, os.urandom(2*SAMPLESIZE)]
+		for i in range(len(contents)):
+			fout = open("../test/folder/test"+str(i)+".bin", "wb")
+			fout.write(contents[i])
+			fout.close()
+		archiver = Archiver("../test/folder", estimate=True)
+		ba = bytearray()
+		raw = 0
+		while True:
+			data = archiver.read()
+			if len(data) == 0:
+				break
+			if isinstance(data, RawData):
+				raw += len(data)
+			ba += data
+		self.assertTrue(raw == len(contents[1]))
+		dearchiver = Dearchiver("../test/output")
+		for i in range(0, len(ba), 1000):
+			dearchiver.write(ba[i:i+1000])
+		dearchiver.close()
+		for i in range(len(contents)):
+			fin = open("../test/output/folder/test"+str(i)+".bin", "rb")
+			self.assertTrue(fin.read() == contents[i])
+			fin.close()
+		shutil.rmtree(testfolder)
+
+	def test_many(self):
+		testfolder = "../test"
+		os.makedirs("../test/folder")
+		count = 3000
+		for i in range(count):
+			fout = open("../test/folder/test"+str(i)+".txt", "wb")
+			fout.write(str(i).encode()*(i%3))
+			fout.close()
+		archiver = Archiver("../test/folder")
+		ba = bytearray()
+		while True:
+			data = archiver.read()
+			if len(data) == 0:
+				break
+			ba += data
+		for size, writers in [(len(ba), 0), (7, 0), (len(ba), 4), (7, 4)]:
+			output = "../test/output"+str(size)+"-"+str(writers)
+			dearchiver = Dearchiver(output, 64, writers, 8)
+			for i in range(0, len(ba), size):
+				dearchiver.write(memoryview(ba)[i:i+size])
+			dearchiver.close()
+			self.assertTrue(dearchiver.bytesWritten == sum(len(str(i))*(i%3) for i in range(count)))
+			for i in range(count):
+				fin = open(output+"/folder/test"+str(i)+".txt", "rb")
+				self.assertTrue(fin.read() == str(i).encode()*(i%3))
+				fin.close()
+		shutil.rmtree(testfolder)
+
+	def test_dedup(self):
+		testfolder = "../test"
+		os.makedirs("../test/folder/sub")
+		contents = {"a.txt": b"same content"*100, "b.txt": b"other content"*100, "sub/c.txt": b"same content"*100, "sub/d.txt": b"x"*1200}
+		for name in contents:
+			fout = open("../test/folder/"+name, "wb")
+			fout.write(contents[name])
+			fout.close()
+		os.link("../test/folder/b.txt", "../test/folder/sub/e.txt")
+		contents["sub/e.txt"] = contents["b.txt"]
+		sizes = []
+		for dedup in [False, True]:
+			archiver = Archiver("../test/folder", dedup=dedup)
+			ba = bytearray()
+			while True:
+				data = archiver.read()
+				if len(data) == 0:
+					break
+				ba += data
+			sizes.append(len(ba))
+			references = [member.name.replace(os.sep, "/") for member in archiver.members if member.flags & REFERENCE]
+			self.assertTrue(sorted(references) == (["folder/sub/c.txt", "folder/sub/e.txt"] if dedup else []))
+			for writers in [0, 2]:
+				output = "../test/output"+str(dedup)+str(writers)
+				dearchiver = Dearchiver(output, 64, writers)
+				for i in range(0, len(ba), 100):
+					dearchiver.write(ba[i:i+100])
+				dearchiver.close()
+				for name in contents:
+					fin = open(output+"/folder/"+name, "rb")
+					self.assertTrue(fin.read() == contents[name])
+					fin.close()
+				if dedup:
+					self.assertTrue(os.path.samefile(output+"/folder/b.txt", output+"/folder/sub/e.txt"))
+					self.assertFalse(os.path.samefile(output+"/folder/a.txt", output+"/folder/sub/c.txt"))
+		self.assertTrue(sizes[1] < sizes[0]-2000)
+		shutil.rmtree(testfolder)
+
+	def test_incremental(self):
+		testfolder = "../test"
+		os.makedirs("../test/folder/sub")
+		contents = {"a.txt": b"first", "sub/b.txt": b"second", "sub/c.txt": b"third"}
+		for name in contents:
+			fout = open("../test/folder/"+name, "wb")
+			fout.write(contents[name])
+			fout.close()
+		archives = []
+		previous = None
+		for step in range(3):
+			if step == 1:
+				os.remove("../test/folder/sub/b.txt")
+				fout = open("../test/folder/a.txt", "ab")
+				fout.write(b" changed")
+				fout.close()
+				os.utime("../test/folder/sub/c.txt", ns=(0, 0))
+			archiver = Archiver("../test/folder", incremental=True, previous=previous)
+			ba = bytearray()
+			while True:
+				data = archiver.read()
+				if len(data) == 0:
+					break
+				ba += data
+			archives.append(ba)
+			names = sorted((member.name.replace(os.sep, "/"), member.flags) for member in archiver.members)
+			if step == 0:
+				self.assertTrue(names == [("folder/a.txt", 0), ("folder/sub/b.txt", 0), ("folder/sub/c.txt", 0)])
+			elif step == 1:
+				self.assertTrue(names == [("folder/a.txt", 0), ("folder/sub/b.txt", DELETED)])
+			else:
+				self.assertTrue(names == [])
+			self.assertTrue(sorted(archiver.records) == sorted(os.path.join("folder", *name.split("/")) for name in ["a.txt", "sub/c.txt"] + (["sub/b.txt"] if step == 0 else [])))
+			previous = archiver.records
+		for ba in archives:
+			dearchiver = Dearchiver("../test/output")
+			dearchiver.write(ba)
+			dearchiver.close()
+		self.assertFalse(os.path.exists("../test/output/folder/sub/b.txt"))
+		for name in ["a.txt", "sub/c.txt"]:
+			fin1 = open("../test/folder/"+name, "rb")
+			fin2 = open("../test/output/folder/"+name, "rb")
+			self.assertTrue(fin1.read() == fin2.read())
+			fin1.close()
+			fin2.close()
+		shutil.rmtree(testfolder)
+
+	def test_truncated(self):
+		testfolder = "../test"
+		os.makedirs(testfolder)
+		for data in [b"\x00\x01a"+(10).to_bytes(8, "big")+b"12345", b"\x00\x01a"+(0).to_bytes(8, "big")+b"\x00\x05b"]:
+			dearchiver = Dearchiver(testfolder)
+			dearchiver.write(bytearray(data))
+			self.assertRaises(ValueError, dearchiver.close)
+		dearchiver = Dearchiver(testfolder)
+		dearchiver.write(bytearray(b"\x00\x01a"+(0).to_bytes(8, "big")+b"\x00\x05b"))
+		dearchiver.close(True)
+		dearchiver = Dearchiver(testfolder, writers=2)
+		dearchiver.write(bytearray(b"\x00\x01a"+(5).to_bytes(8, "big")+b"12345"))
+		dearchiver.close()
+		shutil.rmtree(testfolder)
+
+	def test_forwardreference(self):
+		testfolder = "../test"
+		os.makedirs(testfolder)
+		for writers in [0, 2]:
+			for kind in [COPY, LINK]:
+				# the reference b comes before its target a
+				reference = bytearray([EXTENDED >> 8, 1])+b"b"+bytes([REFERENCE])+(2).to_bytes(8, "big")+bytes([kind])+b"a"
+				dearchiver = Dearchiver(testfolder, writers=writers)
+				dearchiver.write(reference+b"\x00\x01a"+(5).to_bytes(8, "big")+b"12345")
+				dearchiver.close()
+				fin = open(testfolder+"/b", "rb")
+				self.assertTrue(fin.read() == b"12345")
+				fin.close()
+		dearchiver = Dearchiver(testfolder)
+		dearchiver.write(bytearray([EXTENDED >> 8, 1])+b"c"+bytes([REFERENCE])+(2).to_bytes(8, "big")+bytes([COPY])+b"x")
+		self.assertRaises(ValueError, dearchiver.close)
+		shutil.rmtree(testfolder)
+
+	def test_stream(self):
+		testfolder = "../test"
+		srcfile = "../test.txt"
+		fin = open(srcfile, "rb")
+		ba1 = fin.read()
+		fin.close()
+		stdin = sys.stdin
+		stdout = sys.stdout
+		try:
+			sys.stdin = io.TextIOWrapper(io.BytesIO(ba1))
+			archiver = Archiver(STREAM, name="piped.txt")
+			archive = bytearray()
+			while True:
+				ba = archiver.read()
+				if len(ba) == 0:
+					break
+				archive += ba
+			dearchiver = Dearchiver(testfolder)
+			for i in range(0, len(archive), 1000):
+				dearchiver.write(archive[i:i+1000])
+			dearchiver.close()
+			fin = open(testfolder+"/piped.txt", "rb")
+			self.assertTrue(fin.read() == ba1)
+			fin.close()
+			sys.stdout = io.TextIOWrapper(io.BytesIO())
+			dearchiver = Dearchiver(STREAM)
+			dearchiver.write(archive)
+			dearchiver.close()
+			self.assertTrue(sys.stdout.buffer.getvalue() == ba1)
+		finally:
+			sys.stdin = stdin
+			sys.stdout = stdout
 		shutil.rmtree(testfolder)
\ No newline at end of file
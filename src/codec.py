@@ -0,0 +1,701 @@
+import bz2
+import lzma
+import os
+import unittest
+import zlib
+from typing import Callable, Dict, Optional, Union
+
+from compressor import Compressor, Decompressor, MAGIC, LEGACY, LZW, header
+
+STORE = 2
+ZLIB = 3
+BZ2 = 4
+LZMA = 5
+FRAMED = 6
+PIECEHEADERSIZE = 4
+END = 0
+CODED = 1
+RAW = 2
+FRAMEHEADERSIZE = 5
+FRAMESIZE = 256*1024
+SAMPLESIZE = 16*1024
+ESTIMATERATIO = 0.9
+
+Data = Union[bytes, bytearray, memoryview]
+
+
+class RawData(bytearray):
+	"""
+	RawData is data that is known to be incompressible and is stored without compression.
+	"""
+
+
+def isCompressible(sample: Data) -> bool:
+	"""
+	Estimates if data is compressible by a trial compression of a sample.
+
+	Parameters:
+		sample: first bytes of the data
+
+	Returns:
+		status if the fastest zlib level shrinks the sample below ESTIMATERATIO
+	"""
+	return len(zlib.compress(sample, 1)) < len(sample)*ESTIMATERATIO
+
+
+class StoreCompressor:
+	"""
+	StoreCompressor copies data without compressing it.
+
+	Attributes:
+		headerWritten: status if the header was returned
+
+	Note:
+		Data is written in pieces prefixed by their 4 byte length, an empty piece ends the stream.
+	"""
+	def __init__(self):
+		self.headerWritten: bool = False
+
+	def compress(self, data: Data) -> bytearray:
+		"""
+		Stores data.
+
+		Parameters:
+			data: data
+
+		Returns:
+			header, length and data
+		"""
+		returnvalue = bytearray()
+		if not self.headerWritten:
+			returnvalue += header(STORE)
+			self.headerWritten = True
+		if len(data) > 0:
+			returnvalue += len(data).to_bytes(PIECEHEADERSIZE, "big")
+			returnvalue += data
+		return returnvalue
+
+	def close(self) -> bytearray:
+		"""
+		Ends the stream.
+
+		Returns:
+			empty piece
+		"""
+		return self.compress(b"")+bytes(PIECEHEADERSIZE)
+
+
+class StoreDecompressor:
+	"""
+	StoreDecompressor reads the pieces of a StoreCompressor.
+
+	Attributes:
+		buffer: unprocessed data
+		remaining: bytes left in the actual piece
+		finished: status if the empty piece was read
+	"""
+	def __init__(self):
+		self.buffer: bytearray = bytearray()
+		self.remaining: int = 0
+		self.finished: bool = False
+
+	def decompress(self, data: Data) -> bytearray:
+		"""
+		Reads pieces.
+
+		Parameters:
+			data: stream behind the header
+
+		Returns:
+			stored data
+		"""
+		returnvalue = bytearray()
+		if self.finished:
+			return returnvalue
+		self.buffer += data
+		offset = 0
+		while offset < len(self.buffer):
+			if self.remaining == 0:
+				if len(self.buffer)-offset < PIECEHEADERSIZE:
+					break
+				self.remaining = int.from_bytes(self.buffer[offset:offset+PIECEHEADERSIZE], "big")
+				offset += PIECEHEADERSIZE
+				if self.remaining == 0:
+					self.finished = True
+					offset = len(self.buffer)
+					break
+			length = min(self.remaining, len(self.buffer)-offset)
+			returnvalue += self.buffer[offset:offset+length]
+			self.remaining -= length
+			offset += length
+		del self.buffer[:offset]
+		return returnvalue
+
+	def close(self) -> bytearray:
+		"""
+		Checks the end of the stream.
+
+		Returns:
+			empty bytearray
+
+		Note:
+			Raises ValueError if the empty piece is missing.
+		"""
+		if not self.finished:
+			raise ValueError("compressed data is truncated")
+		return bytearray()
+
+
+class LibraryCompressor:
+	"""
+	LibraryCompressor wraps a compressor of the standard library.
+
+	Attributes:
+		codecId: id of the codec
+		compressor: zlib, bz2 or lzma compressor
+		params: parameters of the header
+		headerWritten: status if the header was returned
+
+	Parameters:
+		codecId: id of the codec
+		compressor: zlib, bz2 or lzma compressor
+		params: parameters of the header
+	"""
+	def __init__(self, codecId: int, compressor, params: bytes=b""):
+		self.codecId: int = codecId
+		self.compressor = compressor
+		self.params: bytes = params
+		self.headerWritten: bool = False
+
+	def compress(self, data: Data) -> bytearray:
+		"""
+		Compresses data.
+
+		Parameters:
+			data: data
+
+		Returns:
+			compressed data, the header in front of the first call
+		"""
+		returnvalue = bytearray()
+		if not self.headerWritten:
+			returnvalue += header(self.codecId, self.params)
+			self.headerWritten = True
+		returnvalue += self.compressor.compress(data)
+		return returnvalue
+
+	def close(self) -> bytearray:
+		"""
+		Flushes the compressor.
+
+		Returns:
+			remaining compressed data
+		"""
+		return self.compress(b"")+self.compressor.flush()
+
+
+class LibraryDecompressor:
+	"""
+	LibraryDecompressor wraps a decompressor of the standard library.
+
+	Attributes:
+		decompressor: zlib, bz2 or lzma decompressor
+
+	Parameters:
+		decompressor: zlib, bz2 or lzma decompressor
+
+	Note:
+		Data behind the end of the compressed stream, like the padding of the last block, is ignored.
+	"""
+	def __init__(self, decompressor):
+		self.decompressor = decompressor
+
+	def decompress(self, data: Data) -> bytearray:
+		"""
+		Decompresses data.
+
+		Parameters:
+			data: stream behind the header
+
+		Returns:
+			decompressed data
+
+		Note:
+			Raises ValueError if the data is damaged.
+		"""
+		if self.decompressor.eof:
+			return bytearray()
+		try:
+			return bytearray(self.decompressor.decompress(data))
+		except (zlib.error, OSError, lzma.LZMAError) as e:
+			raise ValueError("damaged compressed data: "+str(e))
+
+	def close(self) -> bytearray:
+		"""
+		Checks the end of the stream.
+
+		Returns:
+			empty bytearray
+
+		Note:
+			Raises ValueError if the stream is not complete.
+		"""
+		if not self.decompressor.eof:
+			raise ValueError("compressed data is truncated")
+		return bytearray()
+
+
+class FrameCompressor:
+	"""
+	FrameCompressor compresses blocks with a fresh compressor each and stores blocks that do not shrink.
+
+	Attributes:
+		compression: keyword arguments of createCompressor for each frame
+		frameSize: size of the plain blocks
+		buffer: data of the unfinished block
+		raw: status if the data in buffer is RawData
+		headerWritten: status if the header was returned
+
+	Parameters:
+		compression: keyword arguments of createCompressor for each frame
+		framesize: size of the plain blocks
+
+	| **Pre:**
+	|	framesize > 0
+	|	framesize < 2**32
+
+	Note:
+		Each frame consists of its type, the 4 byte length of its payload and the payload.
+		CODED frames hold a complete compressed stream, RAW frames hold the plain data, END ends the stream.
+		RawData is collected in RAW frames without trying to compress it.
+		A first compressor is created right away, so bad options raise before any data is compressed.
+	"""
+	def __init__(self, compression: Dict[str, int]=None, framesize: int=FRAMESIZE):
+		self.compression: Dict[str, int] = compression or {}
+		self.frameSize: int = framesize
+		self.buffer: bytearray = bytearray()
+		self.raw: bool = False
+		self.headerWritten: bool = False
+		createCompressor(**self.compression)
+
+	def compress(self, data: Data) -> bytearray:
+		"""
+		Compresses data.
+
+		Parameters:
+			data: data
+
+		Returns:
+			frames of all finished blocks
+
+		| **Modifies:**
+		|	self.buffer
+		|	self.raw
+		"""
+		returnvalue = bytearray()
+		if not self.headerWritten:
+			returnvalue += header(FRAMED)
+			self.headerWritten = True
+		if len(data) == 0:
+			return returnvalue
+		raw = isinstance(data, RawData)
+		if raw != self.raw:
+			returnvalue += self.flush()
+			self.raw = raw
+		self.buffer += data
+		offset = 0
+		while len(self.buffer)-offset >= self.frameSize:
+			block = memoryview(self.buffer)[offset:offset+self.frameSize]
+			if self.raw:
+				returnvalue += self.frame(RAW, block)
+			else:
+				returnvalue += self.compressFrame(block)
+			block.release()
+			offset += self.frameSize
+		del self.buffer[:offset]
+		return returnvalue
+
+	def compressFrame(self, block: Data) -> bytearray:
+		"""
+		Compresses a block.
+
+		Parameters:
+			block: plain block
+
+		Returns:
+			CODED frame, RAW frame if the compressed block is not smaller
+		"""
+		compressor = createCompressor(**self.compression)
+		compressed = compressor.compress(block)
+		compressed += compressor.close()
+		if len(compressed) < len(block):
+			return self.frame(CODED, compressed)
+		return self.frame(RAW, block)
+
+	def frame(self, type: int, payload: Data) -> bytearray:
+		"""
+		Creates a frame.
+
+		Parameters:
+			type: CODED, RAW or END
+			payload: payload
+
+		Returns:
+			frame
+		"""
+		frame = bytearray([type])
+		frame += len(payload).to_bytes(FRAMEHEADERSIZE-1, "big")
+		frame += payload
+		return frame
+
+	def flush(self) -> bytearray:
+		"""
+		Compresses the unfinished block.
+
+		Returns:
+			frame of the block, empty if there is no data
+
+		| **Modifies:**
+		|	self.buffer
+		"""
+		if len(self.buffer) == 0:
+			return bytearray()
+		if self.raw:
+			returnvalue = self.frame(RAW, self.buffer)
+		else:
+			returnvalue = self.compressFrame(self.buffer)
+		self.buffer = bytearray()
+		return returnvalue
+
+	def close(self) -> bytearray:
+		"""
+		Compresses the unfinished block and ends the stream.
+
+		Returns:
+			remaining frames and the END frame
+		"""
+		return self.compress(b"")+self.flush()+self.frame(END, b"")
+
+
+class FrameDecompressor:
+	"""
+	FrameDecompressor decompresses the frames of a FrameCompressor.
+
+	Attributes:
+		buffer: data of unfinished frames
+		finished: status if the END frame was read
+	"""
+	def __init__(self):
+		self.buffer: bytearray = bytearray()
+		self.finished: bool = False
+
+	def decompress(self, data: Data) -> bytearray:
+		"""
+		Decompresses all complete frames.
+
+		Parameters:
+			data: stream behind the header
+
+		Returns:
+			decompressed data
+		"""
+		returnvalue = bytearray()
+		if self.finished:
+			return returnvalue
+		self.buffer += data
+		offset = 0
+		while len(self.buffer)-offset >= FRAMEHEADERSIZE:
+			type = self.buffer[offset]
+			if type == END:
+				self.finished = True
+				offset = len(self.buffer)
+				break
+			length = int.from_bytes(self.buffer[offset+1:offset+FRAMEHEADERSIZE], "big")
+			if len(self.buffer)-offset < FRAMEHEADERSIZE+length:
+				break
+			payload = memoryview(self.buffer)[offset+FRAMEHEADERSIZE:offset+FRAMEHEADERSIZE+length]
+			if type == RAW:
+				returnvalue += payload
+			elif type == CODED:
+				decompressor = CodecDecompressor()
+				returnvalue += decompressor.decompress(payload)
+				returnvalue += decompressor.close()
+			else:
+				raise ValueError("unsupported frame type "+str(type))
+			payload.release()
+			offset += FRAMEHEADERSIZE+length
+		del self.buffer[:offset]
+		return returnvalue
+
+	def close(self) -> bytearray:
+		"""
+		Checks the end of the stream.
+
+		Returns:
+			empty bytearray
+
+		Note:
+			Raises ValueError if the END frame is missing.
+		"""
+		if not self.finished:
+			raise ValueError("compressed data is truncated")
+		return bytearray()
+
+
+class Codec:
+	"""
+	Codec describes a compression format.
+
+	Attributes:
+		name: name used on the commandline
+		codecId: id in the header of the stream
+		compressor: creates a compressor from keyword arguments
+		decompressor: creates a decompressor from the parameters of the header
+		levels: valid compression levels, None if the codec has no level
+
+	Parameters:
+		name: name used on the commandline
+		codecId: id in the header of the stream
+		compressor: creates a compressor from keyword arguments
+		decompressor: creates a decompressor from the parameters of the header
+		levels: valid compression levels, None if the codec has no level
+
+	| **Pre:**
+	|	codecId >= 0
+	|	codecId < 256
+	|	codecId != MAGIC
+	"""
+	def __init__(self, name: str, codecId: int, compressor: Callable, decompressor: Callable[[bytes], object], levels: range=None):
+		self.name: str = name
+		self.codecId: int = codecId
+		self.compressor: Callable = compressor
+		self.decompressor: Callable[[bytes], object] = decompressor
+		self.levels: Optional[range] = levels
+
+
+CODECS: Dict[str, Codec] = {}
+CODECIDS: Dict[int, Codec] = {}
+
+
+def registerCodec(codec: Codec):
+	"""
+	Adds a codec to the registry.
+
+	Parameters:
+		codec: codec
+
+	| **Pre:**
+	|	codec.name not in CODECS
+	|	codec.codecId not in CODECIDS
+	"""
+	CODECS[codec.name] = codec
+	CODECIDS[codec.codecId] = codec
+
+
+def lzwDecompressor(params: bytes) -> Decompressor:
+	"""
+	Creates a Decompressor for a LZW stream whose header was already read.
+
+	Parameters:
+		params: parameters of the header
+
+	Returns:
+		decompressor
+	"""
+	decompressor = Decompressor()
+	decompressor.setFormat(LZW, params)
+	return decompressor
+
+
+def levelParams(level: Optional[int]) -> bytes:
+	"""
+	Creates the parameters of the header of a library codec.
+
+	Parameters:
+		level: compression level, None for the default of the library
+
+	Returns:
+		level as single byte, empty for the default
+	"""
+	return bytes([level]) if level is not None else b""
+
+
+registerCodec(Codec("store", STORE, StoreCompressor, lambda params: StoreDecompressor()))
+registerCodec(Codec("lzw", LZW, lambda **options: Compressor(LZW, **options), lzwDecompressor))
+registerCodec(Codec("zlib", ZLIB,
+	lambda level=None: LibraryCompressor(ZLIB, zlib.compressobj(-1 if level is None else level), levelParams(level)),
+	lambda params: LibraryDecompressor(zlib.decompressobj()), range(0, 10)))
+registerCodec(Codec("bz2", BZ2,
+	lambda level=None: LibraryCompressor(BZ2, bz2.BZ2Compressor(9 if level is None else level), levelParams(level)),
+	lambda params: LibraryDecompressor(bz2.BZ2Decompressor()), range(1, 10)))
+registerCodec(Codec("lzma", LZMA,
+	lambda level=None: LibraryCompressor(LZMA, lzma.LZMACompressor(preset=level), levelParams(level)),
+	lambda params: LibraryDecompressor(lzma.LZMADecompressor()), range(0, 10)))
+registerCodec(Codec("framed", FRAMED, FrameCompressor, lambda params: FrameDecompressor()))
+
+
+def createCompressor(codec: str="lzw", **options):
+	"""
+	Creates the compressor of a codec.
+
+	Parameters:
+		codec: name of the codec
+		options: keyword arguments of the compressor, level for zlib, bz2 and lzma
+
+	Returns:
+		compressor with compress and close
+
+	| **Pre:**
+	|	codec in CODECS
+	"""
+	return CODECS[codec].compressor(**options)
+
+
+class CodecDecompressor:
+	"""
+	CodecDecompressor decompresses streams of all codecs.
+
+	Attributes:
+		buffer: data until the header is complete
+		decompressor: decompressor of the codec, None until the header is read
+
+	Note:
+		The codec is read from the header, streams without a header are decompressed as legacy streams.
+		Raises ValueError if the codec is unknown.
+	"""
+	def __init__(self):
+		self.buffer: bytearray = bytearray()
+		self.decompressor = None
+
+	def decompress(self, data: Data) -> bytearray:
+		"""
+		Decompresses data.
+
+		Parameters:
+			data: compressed data
+
+		Returns:
+			decompressed data
+		"""
+		if self.decompressor is not None:
+			return self.decompressor.decompress(data)
+		self.buffer += data
+		if len(self.buffer) == 0:
+			return bytearray()
+		if self.buffer[0] != MAGIC:
+			self.decompressor = Decompressor()
+		elif len(self.buffer) < 3 or len(self.buffer) < 3+self.buffer[2]:
+			return bytearray()
+		else:
+			codec = CODECIDS.get(self.buffer[1])
+			if codec is None:
+				raise ValueError("unsupported codec "+str(self.buffer[1]))
+			self.decompressor = codec.decompressor(bytes(self.buffer[3:3+self.buffer[2]]))
+			del self.buffer[:3+self.buffer[2]]
+		data = self.buffer
+		self.buffer = bytearray()
+		return self.decompressor.decompress(data)
+
+	def close(self) -> bytearray:
+		"""
+		Decompresses the remaining data.
+
+		Returns:
+			decompressed data
+		"""
+		if self.decompressor is None:
+			if len(self.buffer) > 0:
+				raise ValueError("compressed data is truncated")
+			return bytearray()
+		return self.decompressor.close()
+
+	def isLegacy(self) -> bool:
+		"""
+		Checks if the stream is a legacy stream.
+
+		Returns:
+			True if the stream has no header, its padding may decompress to random bytes
+		"""
+		return isinstance(self.decompressor, Decompressor) and self.decompressor.format == LEGACY
+
+
+class CodecUnitTest(unittest.TestCase):
+	def setUp(self):
+		fin = open("../test.txt", "rb")
+		self.plain = fin.read(200000)
+		fin.close()
+
+	def tearDown(self):
+		self.plain = None
+
+	def test_codecs(self):
+		for name in CODECS:
+			compressor = createCompressor(name)
+			compressed = bytearray()
+			for i in range(0, len(self.plain), 30000):
+				compressed += compressor.compress(self.plain[i:i+30000])
+			compressed += compressor.close()
+			self.assertTrue(compressed[1] == CODECS[name].codecId)
+			if name != "store":
+				self.assertTrue(len(compressed) < len(self.plain))
+			# random bytes behind the end like the padding of the last block
+			compressed += os.urandom(100)
+			decompressor = CodecDecompressor()
+			decompressed = bytearray()
+			for i in range(0, len(compressed), 1000):
+				decompressed += decompressor.decompress(compressed[i:i+1000])
+			decompressed += decompressor.close()
+			self.assertTrue(decompressed == self.plain)
+			if CODECS[name].levels is not None:
+				for level in CODECS[name].levels:
+					createCompressor(name, level=level)
+		with self.assertRaises(ValueError):
+			FrameCompressor({"codec": "bz2", "level": 0})
+
+	def test_frames(self):
+		compressor = FrameCompressor({"codec": "zlib"}, 50000)
+		random = os.urandom(60000)
+		compressed = compressor.compress(self.plain[:120000])
+		compressed += compressor.compress(random)
+		compressed += compressor.compress(RawData(self.plain[120000:130000]))
+		compressed += compressor.compress(self.plain[130000:])
+		compressed += compressor.close()
+		self.assertTrue(len(compressed) < len(self.plain)+len(random))
+		types = []
+		offset = 3
+		while compressed[offset] != END:
+			types.append(compressed[offset])
+			offset += FRAMEHEADERSIZE+int.from_bytes(compressed[offset+1:offset+FRAMEHEADERSIZE], "big")
+		self.assertTrue(types == [CODED, CODED, CODED, RAW, RAW, CODED, CODED])
+		decompressor = CodecDecompressor()
+		decompressed = decompressor.decompress(compressed+os.urandom(100))
+		decompressed += decompressor.close()
+		self.assertTrue(decompressed == self.plain[:120000]+random+self.plain[120000:])
+		self.assertTrue(isCompressible(self.plain[:SAMPLESIZE]))
+		self.assertFalse(isCompressible(random[:SAMPLESIZE]))
+
+	def test_legacy(self):
+		compressor = Compressor(LEGACY)
+		compressed = compressor.compress(bytearray(self.plain))
+		compressed += compressor.close()
+		decompressor = CodecDecompressor()
+		decompressed = decompressor.decompress(compressed)
+		decompressed += decompressor.close()
+		self.assertTrue(decompressed == self.plain)
+		self.assertTrue(decompressor.isLegacy())
+
+	def test_damaged(self):
+		for name in ["zlib", "bz2", "lzma"]:
+			compressor = createCompressor(name)
+			compressed = bytearray(compressor.compress(self.plain[:50000])+compressor.close())
+			# keep the codec header and the header of the library, damage the rest
+			compressed[20:] = bytes(255-b for b in compressed[20:])
+			decompressor = CodecDecompressor()
+			with self.assertRaises(ValueError):
+				decompressor.decompress(compressed)
+				decompressor.close()
+
+	def test_unknown(self):
+		decompressor = CodecDecompressor()
+		with self.assertRaises(ValueError):
+			decompressor.decompress(header(200))
@@ -1,36 +1,125 @@
 import unittest
-from typing import Dict,Tuple,List
+from typing import Dict,List
 import shutil
 from filebuffer import ReadBuffer, WriteBuffer
 import os
 
+MAGIC = 0xED
+LEGACY = 0
+LZW = 1
+CLEAR = 256
+STOP = 257
+MINWIDTH = 9
+MAXWIDTH = 24
+FREEZE = 0
+RESET = 1
+ADAPTIVE = 2
+POLICIES = {"freeze": FREEZE, "reset": RESET, "adaptive": ADAPTIVE}
+WINDOW = 16*1024
+# the Encoder pads the last block of 256 bytes with random bytes
+PADDINGSIZE = 256
+
+
+def header(format: int, params: bytes=b"") -> bytes:
+	"""
+	Creates the header of a compressed stream.
+
+	Parameters:
+		format: format of the stream
+		params: parameters of the format
+
+	Returns:
+		MAGIC, format, length of params and params
+
+	| **Pre:**
+	|	len(params) < 256
+	"""
+	return bytes([MAGIC, format, len(params)])+params
+
+
+def codeWidth(count: int, maxWidth: int) -> int:
+	"""
+	Gets the number of bits of a LZW code.
+
+	Parameters:
+		count: number of codes written since the dictionary was cleared
+		maxWidth: number of bits of the largest code of a full dictionary
+
+	Returns:
+		number of bits of the next code
+
+	Note:
+		Each written code adds at most one entry, so the next code is at most 257+count.
+	"""
+	return min(maxWidth, max(MINWIDTH, (STOP+count).bit_length()))
+
 
 class Compressor:
 	"""
 	Compressor compresses bytearrays.
 
 	Attributes:
-		dict: compression-dictionary
+		dict: compression-dictionary, maps the code of a phrase shifted by 8 bits plus the next byte to the code of the longer phrase
 		size: actual size of dict
 		maxSize: maximum size of dict
-		buffer: buffer for unprocessed data
+		buffer: code of the unfinished phrase, None if there is none
+		format: LZW or LEGACY
+		maxWidth: number of bits of the largest code
+		policy: FREEZE, RESET or ADAPTIVE, applied when dict is full
+		threshold: minimum ratio of a window in percent of self.bestRatio, used by ADAPTIVE
+		count: number of codes written since dict was cleared
+		bits: bits that do not fill a byte yet
+		bitCount: number of bits in self.bits
+		headerWritten: status if the header was returned
+		inputCount: number of compressed bytes
+		bitsWritten: number of written bits
+		windowInput: inputCount at the start of the window of ADAPTIVE
+		windowBits: bitsWritten at the start of the window of ADAPTIVE
+		bestRatio: best ratio of input bits to output bits of a window since dict is full
 
 	Parameters:
+		format: LZW writes codes of growing width behind a header, LEGACY writes 2 byte codes and a byte per entry
+		maxwidth: number of bits of the largest code, the dictionary holds 2**maxwidth entries
+		policy: FREEZE keeps a full dictionary, RESET clears it, ADAPTIVE clears it when the ratio of the last WINDOW bytes drops
+		threshold: minimum ratio of a window in percent of the best ratio of a window since the dictionary is full
 
 	| **Pre:**
+	|	format in [LEGACY, LZW]
+	|	maxwidth >= MINWIDTH
+	|	maxwidth <= MAXWIDTH
+	|	policy in POLICIES.values()
+	|	threshold >= 0
+	|	threshold <= 100
 
 	| **Post:**
-	|	self.size = 256
-	|	self.maxSize = 256*256
+	|	self.size = 256 for LEGACY, 258 for LZW
+	|	self.maxSize = 256*256 for LEGACY, 2**maxwidth for LZW
 	|	self.buffer = None
+
+	Note:
+		The codes 0 to 255 are the single bytes and are not stored in dict.
+		LZW reserves CLEAR and STOP, the stream ends with STOP and is padded with zero bits to a full byte.
+		maxwidth, policy and threshold are the parameters in the header, the policy itself only runs here,
+		a cleared dictionary is announced by CLEAR.
 	"""
-	def __init__(self):
-		self.dict: Dict[Tuple[int], List[int, int]] = {}
-		for i in range(256):
-			self.dict[(i,)] = [-1, i]
-		self.size: int = 256
-		self.maxSize: int = 256*256
-		self.buffer: Tuple[int] = None
+	def __init__(self, format: int=LZW, maxwidth: int=16, policy: int=FREEZE, threshold: int=75):
+		self.dict: Dict[int, int] = {}
+		self.format: int = format
+		self.size: int = 256 if format == LEGACY else STOP+1
+		self.maxSize: int = 256*256 if format == LEGACY else 1 << maxwidth
+		self.maxWidth: int = (self.maxSize-1).bit_length()
+		self.policy: int = policy
+		self.threshold: int = threshold
+		self.buffer: int = None
+		self.count: int = 0
+		self.bits: int = 0
+		self.bitCount: int = 0
+		self.headerWritten: bool = format == LEGACY
+		self.inputCount: int = 0
+		self.bitsWritten: int = 0
+		self.windowInput: int = 0
+		self.windowBits: int = 0
+		self.bestRatio: float = 0.0
 
 	def compress(self, data: bytearray) -> bytearray:
 		"""
@@ -43,41 +132,155 @@ class Compressor:
 			compressed data
 
 		| **Modifies:**
-		|	data
 		|	self.dict
 		|	self.size
 		|	self.buffer
 		"""
-		bytemessage = ()
-		if self.buffer is not None:
-			bytemessage = self.buffer
-			self.buffer = None
+		if self.format == LZW:
+			return self.compressLZW(data)
+		prev = self.buffer
+		phrases = self.dict
 		returnvalue = bytearray()
-		while True:
-			if len(data) == 0:
-				self.buffer = bytemessage
-				break
-			bytemessage += (data.pop(0),)
-			if bytemessage not in self.dict:
+		for b in data:
+			if prev is None:
+				prev = b
+				continue
+			key = (prev << 8) | b
+			code = phrases.get(key)
+			if code is not None:
+				prev = code
+			elif self.size == self.maxSize:
+				returnvalue += bytes((prev >> 8, prev & 255))
+				prev = b
+			else:
+				phrases[key] = self.size
+				self.size += 1
+				returnvalue += bytes((prev >> 8, prev & 255, b))
+				prev = None
+		self.buffer = prev
+		return returnvalue
+
+	def compressLZW(self, data: bytearray) -> bytearray:
+		"""
+		Compresses data to codes of growing width.
+
+		Parameters:
+			data: data to be compressed
+
+		Returns:
+			compressed data
+
+		| **Modifies:**
+		|	self.dict
+		|	self.size
+		|	self.buffer
+		|	self.bits
+		|	self.count
+		"""
+		returnvalue = bytearray()
+		if not self.headerWritten:
+			returnvalue += header(LZW, bytes([self.maxWidth, self.policy, self.threshold]))
+			self.headerWritten = True
+		prev = self.buffer
+		phrases = self.dict
+		bits = self.bits
+		bitCount = self.bitCount
+		width = codeWidth(self.count, self.maxWidth)
+		for i, b in enumerate(data):
+			if prev is None:
+				prev = b
+				continue
+			key = (prev << 8) | b
+			code = phrases.get(key)
+			if code is not None:
+				prev = code
+				continue
+			# same as writeCode, inlined for speed
+			bits |= prev << bitCount
+			bitCount += width
+			self.bitsWritten += width
+			self.count += 1
+			if width < self.maxWidth:
+				width = codeWidth(self.count, self.maxWidth)
+			while bitCount >= 8:
+				returnvalue.append(bits & 255)
+				bits >>= 8
+				bitCount -= 8
+			prev = b
+			if self.size < self.maxSize:
+				phrases[key] = self.size
+				self.size += 1
 				if self.size == self.maxSize:
-					prev = self.dict[bytemessage[:-1]][1]
-					ba = bytearray()
-					ba.append(prev >> 8)
-					ba.append(prev & 255)
-					returnvalue += ba
-					bytemessage = bytemessage[-1:]
-				else:
-					prev = self.dict[bytemessage[:-1]][1]
-					self.dict[bytemessage] = [prev, self.size]
-					self.size += 1
-					ba = bytearray()
-					ba.append(prev >> 8)
-					ba.append(prev & 255)
-					ba.append(bytemessage[-1:][0])
-					returnvalue += ba
-					bytemessage = ()
+					self.windowInput = self.inputCount+i
+					self.windowBits = self.bitsWritten
+			elif self.policy != FREEZE and self.isDegraded(self.inputCount+i):
+				self.bits = bits
+				self.bitCount = bitCount
+				self.writeCode(CLEAR, returnvalue)
+				bits = self.bits
+				bitCount = self.bitCount
+				phrases.clear()
+				self.size = STOP+1
+				self.count = 0
+				self.bestRatio = 0.0
+				width = MINWIDTH
+		self.inputCount += len(data)
+		self.bits = bits
+		self.bitCount = bitCount
+		self.buffer = prev
 		return returnvalue
 
+	def isDegraded(self, inputCount: int) -> bool:
+		"""
+		Checks if a full dictionary should be cleared.
+
+		Parameters:
+			inputCount: number of compressed bytes
+
+		Returns:
+			True for RESET, for ADAPTIVE True if the last WINDOW bytes expanded or their ratio is below self.threshold percent of self.bestRatio
+
+		| **Modifies:**
+		|	self.windowInput
+		|	self.windowBits
+		|	self.bestRatio
+		"""
+		if self.policy == RESET:
+			return True
+		if inputCount-self.windowInput < WINDOW:
+			return False
+		ratio = (inputCount-self.windowInput)*8/max(self.bitsWritten-self.windowBits, 1)
+		self.windowInput = inputCount
+		self.windowBits = self.bitsWritten
+		if ratio < 1 or ratio*100 < self.threshold*self.bestRatio:
+			return True
+		self.bestRatio = max(self.bestRatio, ratio)
+		return False
+
+	def writeCode(self, code: int, output: bytearray):
+		"""
+		Appends a code to the bits and moves all full bytes to output.
+
+		Parameters:
+			code: code
+			output: compressed data
+
+		| **Modifies:**
+		|	output
+		|	self.bits
+		|	self.bitCount
+		|	self.count
+		"""
+		width = codeWidth(self.count, self.maxWidth)
+		self.bits |= code << self.bitCount
+		self.bitCount += width
+		self.bitsWritten += width
+		self.count += 1
+		while self.bitCount >= 8:
+			output.append(self.bits & 255)
+			self.bits >>= 8
+			self.bitCount -= 8
+
 	def close(self):#TODO optimize
 		"""
 		Compresses data and ensures buffer is empty.
@@ -91,13 +294,22 @@ class Compressor:
 		|	self.buffer
 		"""
 		ba = bytearray()
+		if self.format == LZW:
+			ba += self.compressLZW(bytearray())
+			if self.buffer is not None:
+				self.writeCode(self.buffer, ba)
+				self.buffer = None
+			self.writeCode(STOP, ba)
+			if self.bitCount > 0:
+				ba.append(self.bits)
+				self.bits = 0
+				self.bitCount = 0
+			return ba
 		if self.buffer is not None:
-			bytemessage = self.buffer
+			prev = self.buffer
 			self.buffer = None
-			if len(bytemessage) > 0:
-				prev = self.dict[bytemessage][1]
-				ba.append(prev >> 8)
-				ba.append(prev & 255)
+			ba.append(prev >> 8)
+			ba.append(prev & 255)
 		return ba
 
 
@@ -106,10 +318,19 @@ class Decompressor:
 	Decompressor decompresses bytearrays.
 
 	Attributes:
-		uncompressDict: uncompress-dictionary
+		uncompressDict: phrases of all LEGACY codes
 		size: actual size of dict
 		maxSize: maximum size of dict
 		buffer: buffer for unprocessed data
+		finished: status if the end of the compressed data is reached
+		format: format of the stream, None until the first byte is read
+		phrases: phrases of all LZW codes
+		previous: phrase of the last LZW code, None after the dictionary is cleared
+		maxWidth: number of bits of the largest LZW code
+		count: number of read LZW codes
+		bits: bits that do not form a code yet
+		bitCount: number of bits in self.bits
+		padding: number of LEGACY bytes read from the unknown entry on
 
 	Parameters:
 
@@ -119,62 +340,190 @@ class Decompressor:
 	|	self.size = 256
 	|	self.maxSize = 256*256
 	|	self.buffer = None
+	|	self.finished = False
+
+	Note:
+		Streams starting with MAGIC have a header, all other streams are LEGACY.
+		The header of LZW streams holds maxwidth, policy and threshold of the Compressor, a missing maxwidth means 16.
+		In LEGACY streams a reference to an unknown entry can only stem from the padding of the last block and ends the data.
+		If more than PADDINGSIZE bytes follow from that entry on, the password is wrong or the data is damaged
+		and ValueError is raised.
+		LZW streams end with STOP.
 	"""
 	def __init__(self):
-		self.uncompressDict: Dict[int, List[int, Tuple[int]]] = {}
-		for i in range(256):
-			self.uncompressDict[i] = [-1, (i,)]
+		self.finished: bool = False
+		self.format: int = None
+		self.phrases: List[bytes] = [bytes((i,)) for i in range(256)]+[b"", b""]
+		self.previous: bytes = None
+		self.maxWidth: int = 16
+		self.count: int = 0
+		self.bits: int = 0
+		self.bitCount: int = 0
+		self.padding: int = 0
+		self.uncompressDict: List[bytes] = [bytes((i,)) for i in range(256)]
 		self.size: int = 256
 		self.maxSize: int = 256*256
 		self.buffer: bytearray = None
 
 	def decompress(self, data: bytearray) -> bytearray:
 		"""
-		Compresses data.
+		Decompresses data.
 
 		Parameters:
-			data: data to be compressed
+			data: compressed data
 
 		Returns:
-			compressed data
+			decompressed data
 
 		| **Modifies:**
-		|	data
-		|	self.dict
+		|	self.uncompressDict
 		|	self.size
 		|	self.buffer
+
+		Note:
+			The input is read by offset and whole phrases are appended to the output.
 		"""
+		returnvalue = bytearray()
+		if self.finished:
+			if self.format == LEGACY:
+				self.skipPadding(len(data))
+			return returnvalue
 		if self.buffer is not None:
 			data = self.buffer+data
 			self.buffer = None
+		if self.format is None:
+			if len(data) == 0:
+				return returnvalue
+			if data[0] != MAGIC:
+				self.format = LEGACY
+			elif len(data) < 3 or len(data) < 3+data[2]:
+				self.buffer = bytearray(data)
+				return returnvalue
+			else:
+				self.setFormat(data[1], bytes(data[3:3+data[2]]))
+				data = data[3+data[2]:]
+		if self.format == LZW:
+			return self.decompressLZW(data)
+		data = bytes(data)
+		phrases = self.uncompressDict
+		output = bytearray()
+		offset = 0
+		end = len(data)
+		while self.size < self.maxSize and offset+3 <= end:
+			prev = (data[offset] << 8)+data[offset+1]
+			if prev >= self.size:
+				self.finished = True
+				self.skipPadding(end-offset)
+				return output
+			phrase = phrases[prev]+data[offset+2:offset+3]
+			phrases.append(phrase)
+			self.size += 1
+			output += phrase
+			offset += 3
+		if self.size == self.maxSize:
+			for i in range(offset, end-1, 2):
+				output += phrases[(data[i] << 8)+data[i+1]]
+			offset = end-(end-offset)%2
+		if offset < end:
+			self.buffer = bytearray(data[offset:])
+		return output
+
+	def skipPadding(self, length: int):
+		"""
+		Skips bytes behind the end of a LEGACY stream.
+
+		Parameters:
+			length: number of skipped bytes
+
+		| **Modifies:**
+		|	self.padding
+
+		Note:
+			Raises ValueError if more than PADDINGSIZE bytes are skipped in total.
+		"""
+		self.padding += length
+		if self.padding > PADDINGSIZE:
+			raise ValueError("wrong password or damaged data")
+
+	def setFormat(self, format: int, params: bytes=b""):
+		"""
+		Sets the format of the stream, for streams whose header was read elsewhere.
+
+		Parameters:
+			format: format of the stream
+			params: parameters of the header
+
+		| **Modifies:**
+		|	self.format
+		|	self.maxWidth
+		|	self.maxSize
+
+		Note:
+			Raises ValueError if the format is not LZW.
+		"""
+		if format != LZW:
+			raise ValueError("unsupported compression format "+str(format))
+		self.format = LZW
+		if len(params) >= 1:
+			self.maxWidth = params[0]
+			self.maxSize = 1 << self.maxWidth
+
+	def decompressLZW(self, data: bytearray) -> bytearray:
+		"""
+		Decompresses codes of growing width.
+
+		Parameters:
+			data: compressed data behind the header
+
+		Returns:
+			decompressed data
+
+		| **Modifies:**
+		|	self.phrases
+		|	self.previous
+		|	self.bits
+		|	self.count
+		|	self.finished
+
+		Note:
+			Raises ValueError if a code is not in the dictionary.
+		"""
 		returnvalue = bytearray()
-		while True:
-			reqiredlength = 3
-			if self.size == self.maxSize:
-				reqiredlength = 2
-			if len(data) >= reqiredlength:
-				ba = bytearray()
-				ba.append(data.pop(0))
-				ba.append(data.pop(0))
-				if self.size == self.maxSize:
-					index = (ba[0]) << 8
-					index += ba[1]
-					bytemessage = self.uncompressDict[index][1]
-					for b in bytemessage:
-						returnvalue.append(b)
+		phrases = self.phrases
+		bits = self.bits
+		bitCount = self.bitCount
+		width = codeWidth(self.count, self.maxWidth)
+		for b in data:
+			bits |= b << bitCount
+			bitCount += 8
+			while bitCount >= width:
+				code = bits & ((1 << width)-1)
+				bits >>= width
+				bitCount -= width
+				self.count += 1
+				width = codeWidth(self.count, self.maxWidth)
+				if code == STOP:
+					self.finished = True
+					return returnvalue
+				if code == CLEAR:
+					del phrases[STOP+1:]
+					self.previous = None
+					self.count = 0
+					width = MINWIDTH
+					continue
+				if code < len(phrases):
+					phrase = phrases[code]
+				elif code == len(phrases) and self.previous is not None:
+					phrase = self.previous+self.previous[:1]
 				else:
-					ba.append(data.pop(0))
-					prev = (ba[0]) << 8
-					prev += ba[1]
-					bytemessage = self.uncompressDict[prev][1]
-					bytemessage += (ba[2],)
-					self.uncompressDict[self.size] = [prev, bytemessage]
-					self.size += 1
-					for b in bytemessage:
-						returnvalue.append(b)
-			else:
-				self.buffer = data
-				return returnvalue
+					raise ValueError("invalid code "+str(code))
+				returnvalue += phrase
+				if self.previous is not None and len(phrases) < self.maxSize:
+					phrases.append(self.previous+phrase[:1])
+				self.previous = phrase
+		self.bits = bits
+		self.bitCount = bitCount
+		return returnvalue
 
 	def close(self):
 		"""
@@ -186,11 +535,22 @@ class Decompressor:
 			decompressed data
 
 		| **Modifies:**
-		|	self.dict
+		|	self.uncompressDict
 		|	self.size
 		|	self.buffer
+
+		Note:
+			Compressor.close emits the last entry without a byte, which is decompressed here.
 		"""
-		return self.decompress(bytearray())#TODO optimize
+		returnvalue = self.decompress(bytearray())
+		if self.format == LZW and not self.finished:
+			raise ValueError("compressed data is truncated")
+		if not self.finished and self.buffer is not None and len(self.buffer) == 2:
+			index = (self.buffer[0] << 8)+self.buffer[1]
+			if index < self.size:
+				returnvalue += self.uncompressDict[index]
+			self.buffer = None
+		return returnvalue
 
 class FileBufferUnitTest(unittest.TestCase):
 	def setUp(self):
@@ -247,3 +607,48 @@ class FileBufferUnitTest(unittest.TestCase):
 		fin1.close()
 		fin2.close()
 		shutil.rmtree(testfolder)
+
+	def test_formats(self):
+		fin = open(self.srcfile, "rb")
+		ba = fin.read(200000)
+		fin.close()
+		sizes = {}
+		for format in [LEGACY, LZW]:
+			compressor = Compressor(format)
+			compressed = compressor.compress(bytearray(ba))
+			compressed += compressor.close()
+			sizes[format] = len(compressed)
+			if format == LZW:
+				# random bytes behind STOP like the padding of the last block
+				compressed += os.urandom(100)
+			decompressor = Decompressor()
+			decompressed = bytearray()
+			for i in range(0, len(compressed), 1000):
+				decompressed += decompressor.decompress(compressed[i:i+1000])
+			decompressed += decompressor.close()
+			self.assertTrue(decompressed == ba)
+		self.assertTrue(sizes[LZW] < sizes[LEGACY])
+
+	def test_padding(self):
+		decompressor = Decompressor()
+		self.assertTrue(decompressor.decompress(bytearray([0, 65, 66, 255, 255])+bytes(250)) == b"AB")
+		self.assertTrue(decompressor.decompress(bytearray(4)) == b"")
+		self.assertRaises(ValueError, decompressor.decompress, bytearray(1))
+
+	def test_policies(self):
+		fin = open(self.srcfile, "rb")
+		ba = fin.read(100000)
+		fin.close()
+		ba += os.urandom(50000)+ba
+		outputs = []
+		for policy in [FREEZE, RESET, ADAPTIVE]:
+			compressor = Compressor(LZW, 10, policy, 90)
+			compressed = compressor.compress(bytearray(ba))
+			compressed += compressor.close()
+			self.assertTrue(compressed[:6] == header(LZW, bytes([10, policy, 90])))
+			self.assertTrue(compressed[6:] not in outputs)
+			outputs.append(compressed[6:])
+			decompressor = Decompressor()
+			decompressed = decompressor.decompress(compressed)
+			decompressed += decompressor.close()
+			self.assertTrue(decompressed == ba)
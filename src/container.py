@@ -0,0 +1,664 @@
+import os
+import json
+import shutil
+import unittest
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, List, Optional, Union
+
+from archiver import Archiver, Dearchiver, Member, REFERENCE
+from codec import createCompressor, CodecDecompressor, RawData
+from encoder import Encoder, Decoder
+from filebuffer import ReadBuffer
+
+MAGIC = b"\x00EDOC"  # a single stream starts with its seed, which never contains 0
+VERSION = 1
+HEADERSIZE = len(MAGIC)+1+4
+FRAMEHEADERSIZE = 8
+INDEXMAGIC = b"EDOCINDX"
+FOOTERSIZE = 8+len(INDEXMAGIC)
+
+workerEncoder: Optional[Encoder] = None
+workerDecoder: Optional[Decoder] = None
+
+
+def isContainer(data: Union[bytes, bytearray, memoryview]) -> bool:
+	"""
+	Checks if data is the beginning of a chunked file.
+
+	Parameters:
+		data: first bytes of a file
+
+	Returns:
+		status if data starts with MAGIC
+	"""
+	return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def initWorker(password: str, engine: str="auto"):
+	"""
+	Prepares a worker process, so the key schedule is only computed once per process.
+
+	Parameters:
+		password: password
+		engine: engine of the SPBox
+	"""
+	global workerEncoder, workerDecoder
+	workerEncoder = Encoder(password, engine)
+	workerDecoder = Decoder(password, engine)
+
+
+def createPool(workers: int, password: str, engine: str="auto") -> ProcessPoolExecutor:
+	"""
+	Creates a pool of worker processes and starts them right away.
+
+	Parameters:
+		workers: number of worker processes
+		password: password
+		engine: engine of the SPBox
+
+	Returns:
+		pool of prepared worker processes
+
+	Note:
+		ProcessPoolExecutor starts its processes with the first task. With the fork start method,
+		forking inside a pipeline thread while other threads hold locks can deadlock the children,
+		so a first task is waited for here, before the pipeline starts its threads.
+	"""
+	executor = ProcessPoolExecutor(workers, initializer=initWorker, initargs=(password, engine))
+	executor.submit(os.getpid).result()
+	return executor
+
+
+def encodeChunk(data: bytes, encoder: Encoder=None, compression: Dict[str, int]=None, rawRanges: List[List[int]]=None) -> bytes:
+	"""
+	Compresses and encodes a chunk with a fresh dictionary and seed.
+
+	Parameters:
+		data: plain chunk
+		encoder: encoder, the encoder of the worker process if None
+		compression: keyword arguments of createCompressor
+		rawRanges: start and end of the parts of the chunk that were RawData
+
+	Returns:
+		frame consisting of the length of the encoded chunk, the length of the plain chunk and the encoded chunk
+	"""
+	if encoder is None:
+		encoder = workerEncoder
+	compressor = createCompressor(**(compression or {}))
+	compressed = bytearray()
+	offset = 0
+	for start, end in rawRanges or []:
+		compressed += compressor.compress(data[offset:start])
+		compressed += compressor.compress(RawData(data[start:end]))
+		offset = end
+	compressed += compressor.compress(data[offset:])
+	compressed += compressor.close()
+	encoder.reset()
+	encoded = encoder.encode(compressed)
+	encoded += encoder.close()
+	return len(encoded).to_bytes(4, "big")+len(data).to_bytes(4, "big")+bytes(encoded)
+
+
+def decodeChunk(frame: bytes, size: int, decoder: Decoder=None) -> bytes:
+	"""
+	Decodes and decompresses a chunk.
+
+	Parameters:
+		frame: encoded chunk without the frame header
+		size: length of the plain chunk
+		decoder: decoder, the decoder of the worker process if None
+
+	Returns:
+		plain chunk
+
+	Note:
+		Raises ValueError if the chunk does not decompress to size bytes, which happens with a wrong password.
+	"""
+	if decoder is None:
+		decoder = workerDecoder
+	decoder.reset()
+	decoded = decoder.decode(bytearray(frame))
+	decoded += decoder.close()
+	decompressor = CodecDecompressor()
+	plain = decompressor.decompress(decoded)
+	plain += decompressor.close()
+	if len(plain) != size:
+		raise ValueError("wrong password or damaged chunk")
+	return bytes(plain)
+
+
+class ChunkEncoder:
+	"""
+	ChunkEncoder splits data into chunks that are compressed and encoded independently.
+
+	Attributes:
+		chunkSize: size of the plain chunks
+		buffer: data of the unfinished chunk
+		pending: chunks in progress in the order they were submitted
+		maxPending: maximum number of chunks in progress
+		executor: pool of worker processes, None if chunks are encoded in this process
+		encoder: encoder used if executor is None
+		headerWritten: status if the header was returned
+		position: number of bytes returned
+		offsets: positions of the frames in the file
+		members: archived files that are listed in the index
+		compression: keyword arguments of createCompressor for each chunk
+		rawRanges: start and end of the parts of buffer that were RawData
+		records: manifest of the archived tree that is stored in the index
+
+	Parameters:
+		password: password
+		chunksize: size of the plain chunks
+		workers: number of worker processes, chunks are encoded in this process if workers <= 1
+		members: archived files that are listed in the index, no index is written if None
+		engine: engine of the SPBox
+		compression: keyword arguments of createCompressor for each chunk
+		records: manifest of the archived tree that is stored in the index, see Archiver.records
+
+	| **Pre:**
+	|	chunksize > 0
+	|	chunksize < 2**32
+
+	Note:
+		The file starts with MAGIC, VERSION and chunksize, followed by one frame per chunk and an empty frame.
+		Frames are returned in the order of the chunks, independent of the order the workers finish.
+		The index is a frame behind the empty frame, followed by its position and INDEXMAGIC.
+		members and records are read by close, so they may still be filled while data is encoded.
+		The parts of a chunk that were passed as RawData are handed to the compressor as RawData again.
+	"""
+	def __init__(self, password: str, chunksize: int=1024*1024, workers: int=1, members: List[Member]=None, engine: str="auto", compression: Dict[str, int]=None, records: Dict[str, List]=None):
+		self.chunkSize: int = chunksize
+		self.records: Optional[Dict[str, List]] = records
+		self.compression: Optional[Dict[str, int]] = compression
+		self.rawRanges: List[List[int]] = []
+		self.position: int = 0
+		self.offsets: List[int] = []
+		self.members: Optional[List[Member]] = members
+		self.buffer: bytearray = bytearray()
+		self.pending: Deque[Future] = deque()
+		self.maxPending: int = 2*max(workers, 1)
+		self.headerWritten: bool = False
+		self.executor: Optional[ProcessPoolExecutor] = None
+		self.encoder: Optional[Encoder] = None
+		if workers > 1:
+			self.executor = createPool(workers, password, engine)
+		else:
+			self.encoder = Encoder(password, engine)
+
+	def encode(self, data: Union[bytes, bytearray, memoryview]) -> bytearray:
+		"""
+		Encodes data.
+
+		Parameters:
+			data: plain data
+
+		Returns:
+			frames of all chunks that are finished
+
+		| **Modifies:**
+		|	self.buffer
+		|	self.pending
+		"""
+		returnvalue = bytearray()
+		if not self.headerWritten:
+			returnvalue += MAGIC+bytes([VERSION])+self.chunkSize.to_bytes(4, "big")
+			self.position += len(returnvalue)
+			self.headerWritten = True
+		if isinstance(data, RawData) and len(data) > 0:
+			start = len(self.buffer)
+			if len(self.rawRanges) > 0 and self.rawRanges[-1][1] == start:
+				self.rawRanges[-1][1] += len(data)
+			else:
+				self.rawRanges.append([start, start+len(data)])
+		self.buffer += data
+		offset = 0
+		while len(self.buffer)-offset >= self.chunkSize:
+			self.submit(bytes(self.buffer[offset:offset+self.chunkSize]), self.cutRanges(offset, offset+self.chunkSize))
+			returnvalue += self.collect(False)
+			offset += self.chunkSize
+		del self.buffer[:offset]
+		self.rawRanges = self.cutRanges(offset, len(self.buffer)+offset)
+		returnvalue += self.collect(False)
+		return returnvalue
+
+	def cutRanges(self, start: int, end: int) -> List[List[int]]:
+		"""
+		Gets the parts of a section of the buffer that were RawData.
+
+		Parameters:
+			start: start of the section
+			end: end of the section
+
+		Returns:
+			start and end of the parts relative to start
+		"""
+		return [[max(rawStart, start)-start, min(rawEnd, end)-start] for rawStart, rawEnd in self.rawRanges if rawStart < end and rawEnd > start]
+
+	def submit(self, chunk: bytes, rawRanges: List[List[int]]=None):
+		"""
+		Encodes a chunk or hands it to a worker.
+
+		Parameters:
+			chunk: plain chunk
+			rawRanges: start and end of the parts of the chunk that were RawData
+
+		| **Modifies:**
+		|	self.pending
+		"""
+		if self.executor is None:
+			future = Future()
+			future.set_result(encodeChunk(chunk, self.encoder, self.compression, rawRanges))
+			self.pending.append(future)
+		else:
+			self.pending.append(self.executor.submit(encodeChunk, chunk, None, self.compression, rawRanges))
+
+	def collect(self, wait: bool) -> bytearray:
+		"""
+		Collects finished frames in order.
+
+		Parameters:
+			wait: status if all pending chunks should be waited for
+
+		Returns:
+			frames of finished chunks
+
+		Note:
+			If too many chunks are in progress, the oldest is waited for.
+
+		| **Modifies:**
+		|	self.pending
+		|	self.position
+		|	self.offsets
+		"""
+		returnvalue = bytearray()
+		while len(self.pending) > 0:
+			if not (wait or self.pending[0].done() or len(self.pending) >= self.maxPending):
+				break
+			frame = self.pending.popleft().result()
+			self.offsets.append(self.position)
+			self.position += len(frame)
+			returnvalue += frame
+		return returnvalue
+
+	def close(self) -> bytearray:
+		"""
+		Encodes the last chunk, ends the file and appends the index.
+
+		Returns:
+			remaining frames, the empty frame and the index
+
+		| **Post:**
+		|	len(self.pending) == 0
+		"""
+		returnvalue = self.encode(bytearray())
+		if len(self.buffer) > 0:
+			self.submit(bytes(self.buffer), self.rawRanges)
+			self.buffer = bytearray()
+			self.rawRanges = []
+		returnvalue += self.collect(True)
+		returnvalue += bytes(FRAMEHEADERSIZE)
+		self.position += FRAMEHEADERSIZE
+		if self.members is not None:
+			index = {
+				"chunkSize": self.chunkSize,
+				"chunks": self.offsets,
+				"members": [[member.name, member.start, member.end] for member in self.members]
+			}
+			if self.records is not None:
+				index["records"] = self.records
+			indexOffset = self.position
+			self.submit(json.dumps(index).encode())
+			returnvalue += self.collect(True)
+			returnvalue += indexOffset.to_bytes(8, "big")+INDEXMAGIC
+		if self.executor is not None:
+			self.executor.shutdown()
+		return returnvalue
+
+
+class ChunkDecoder:
+	"""
+	ChunkDecoder decodes and decompresses the chunks written by ChunkEncoder.
+
+	Attributes:
+		buffer: data of unfinished frames
+		pending: chunks in progress in the order they were submitted
+		maxPending: maximum number of chunks in progress
+		executor: pool of worker processes, None if chunks are decoded in this process
+		decoder: decoder used if executor is None
+		headerRead: status if the header was read
+		chunkSize: size of the plain chunks
+		finished: status if the empty frame was read
+
+	Parameters:
+		password: password
+		workers: number of worker processes, chunks are decoded in this process if workers <= 1
+		engine: engine of the SPBox
+	"""
+	def __init__(self, password: str, workers: int=1, engine: str="auto"):
+		self.buffer: bytearray = bytearray()
+		self.pending: Deque[Future] = deque()
+		self.maxPending: int = 2*max(workers, 1)
+		self.headerRead: bool = False
+		self.chunkSize: int = 0
+		self.finished: bool = False
+		self.executor: Optional[ProcessPoolExecutor] = None
+		self.decoder: Optional[Decoder] = None
+		if workers > 1:
+			self.executor = createPool(workers, password, engine)
+		else:
+			self.decoder = Decoder(password, engine)
+
+	def decode(self, data: Union[bytes, bytearray, memoryview]) -> bytearray:
+		"""
+		Decodes data.
+
+		Parameters:
+			data: encoded data
+
+		Returns:
+			plain data of all chunks that are finished
+
+		| **Modifies:**
+		|	self.buffer
+		|	self.pending
+
+		Note:
+			Raises ValueError if the header is not supported.
+		"""
+		returnvalue = bytearray()
+		if self.finished:
+			return returnvalue
+		self.buffer += data
+		offset = 0
+		if not self.headerRead:
+			if len(self.buffer) < HEADERSIZE:
+				return returnvalue
+			if not isContainer(self.buffer) or self.buffer[len(MAGIC)] != VERSION:
+				raise ValueError("unsupported file format")
+			self.chunkSize = int.from_bytes(self.buffer[len(MAGIC)+1:HEADERSIZE], "big")
+			self.headerRead = True
+			offset = HEADERSIZE
+		while len(self.buffer)-offset >= FRAMEHEADERSIZE:
+			length = int.from_bytes(self.buffer[offset:offset+4], "big")
+			size = int.from_bytes(self.buffer[offset+4:offset+FRAMEHEADERSIZE], "big")
+			if length == 0:
+				self.finished = True
+				offset = len(self.buffer)
+				break
+			if len(self.buffer)-offset < FRAMEHEADERSIZE+length:
+				break
+			frame = bytes(self.buffer[offset+FRAMEHEADERSIZE:offset+FRAMEHEADERSIZE+length])
+			offset += FRAMEHEADERSIZE+length
+			returnvalue += self.submit(frame, size)
+		del self.buffer[:offset]
+		returnvalue += self.collect(False)
+		return returnvalue
+
+	def submit(self, frame: bytes, size: int) -> bytearray:
+		"""
+		Decodes a chunk or hands it to a worker.
+
+		Parameters:
+			frame: encoded chunk
+			size: length of the plain chunk
+
+		Returns:
+			plain data of all chunks that are finished
+		"""
+		if self.executor is None:
+			return bytearray(decodeChunk(frame, size, self.decoder))
+		self.pending.append(self.executor.submit(decodeChunk, frame, size))
+		return self.collect(False)
+
+	def collect(self, wait: bool) -> bytearray:
+		"""
+		Collects finished chunks in order.
+
+		Parameters:
+			wait: status if all pending chunks should be waited for
+
+		Returns:
+			plain data of finished chunks
+		"""
+		returnvalue = bytearray()
+		while len(self.pending) > 0:
+			if not (wait or self.pending[0].done() or len(self.pending) >= self.maxPending):
+				break
+			returnvalue += self.pending.popleft().result()
+		return returnvalue
+
+	def close(self) -> bytearray:
+		"""
+		Waits for the remaining chunks.
+
+		Returns:
+			plain data of the remaining chunks
+
+		| **Post:**
+		|	len(self.pending) == 0
+
+		Note:
+			Raises ValueError if the file ends before the empty frame.
+		"""
+		returnvalue = self.collect(True)
+		if self.executor is not None:
+			self.executor.shutdown()
+		if not self.finished:
+			raise ValueError("file is truncated")
+		return returnvalue
+
+
+def readFrame(readbuffer: ReadBuffer, offset: int, decoder: Decoder) -> bytes:
+	"""
+	Reads and decodes a single frame.
+
+	Parameters:
+		readbuffer: readbuffer of the file
+		offset: position of the frame in the file
+		decoder: decoder
+
+	Returns:
+		plain chunk
+	"""
+	readbuffer.seek(offset)
+	header = readbuffer.read(FRAMEHEADERSIZE)
+	length = int.from_bytes(header[:4], "big")
+	size = int.from_bytes(header[4:], "big")
+	frame = readbuffer.read(length)
+	if len(frame) != length:
+		raise ValueError("file is truncated")
+	return decodeChunk(bytes(frame), size, decoder)
+
+
+def readIndex(readbuffer: ReadBuffer, decoder: Decoder) -> dict:
+	"""
+	Reads the index of a file written by ChunkEncoder.
+
+	Parameters:
+		readbuffer: readbuffer of the file
+		decoder: decoder
+
+	Returns:
+		index with the keys chunkSize, chunks and members and the key records for incremental archives
+
+	Note:
+		Raises ValueError if the file has no index or the password is wrong.
+	"""
+	if readbuffer.filesize < HEADERSIZE+FOOTERSIZE:
+		raise ValueError("file has no index")
+	readbuffer.seek(readbuffer.filesize-FOOTERSIZE)
+	footer = readbuffer.read(FOOTERSIZE)
+	if bytes(footer[8:]) != INDEXMAGIC:
+		raise ValueError("file has no index")
+	plain = readFrame(readbuffer, int.from_bytes(footer[:8], "big"), decoder)
+	try:
+		return json.loads(plain.decode())
+	except ValueError:
+		raise ValueError("wrong password or damaged index")
+
+
+def readRecords(file: str, password: str, engine: str="auto") -> Dict[str, List]:
+	"""
+	Reads the manifest stored in the index of an incremental archive.
+
+	Parameters:
+		file: path to a file written by ChunkEncoder
+		password: password
+		engine: engine of the SPBox
+
+	Returns:
+		size, mtime and hex digest of every file of the archived tree by name
+
+	Note:
+		Raises ValueError if the file has no index or the index has no manifest.
+	"""
+	readbuffer = ReadBuffer(file)
+	try:
+		index = readIndex(readbuffer, Decoder(password, engine))
+	finally:
+		readbuffer.close()
+	if "records" not in index:
+		raise ValueError(file+" is not an incremental archive")
+	return index["records"]
+
+
+def extractMembers(file: str, password: str, name: str, dearchiver: Dearchiver, engine: str="auto") -> int:
+	"""
+	Extracts a file or folder without decoding the chunks of other files.
+
+	Parameters:
+		file: path to a file written by ChunkEncoder
+		password: password
+		name: path of the file or folder within the archive
+		dearchiver: dearchiver the file is written to
+		engine: engine of the SPBox
+
+	Returns:
+		number of extracted files
+
+	| **Pre:**
+	|	os.path.isfile(file)
+
+	Note:
+		Only the chunks overlapping a matching file are read and decoded.
+		A reference to a file that is not extracted gets the content of that file.
+	"""
+	readbuffer = ReadBuffer(file)
+	decoder = Decoder(password, engine)
+	index = readIndex(readbuffer, decoder)
+	chunkSize = index["chunkSize"]
+	chunks = index["chunks"]
+	prefix = name.rstrip(os.sep)+os.sep
+	cachedChunk = -1
+	plain = b""
+
+	def extract(start: int, end: int):
+		nonlocal cachedChunk, plain
+		for i in range(start//chunkSize, (end-1)//chunkSize+1):
+			if i != cachedChunk:
+				plain = readFrame(readbuffer, chunks[i], decoder)
+				cachedChunk = i
+			chunkStart = i*chunkSize
+			dearchiver.write(plain[max(start-chunkStart, 0):min(end-chunkStart, len(plain))])
+
+	count = 0
+	for memberName, start, end in index["members"]:
+		if memberName != name and not memberName.startswith(prefix):
+			continue
+		extract(start, end)
+		count += 1
+	if len(dearchiver.unresolved) > 0:
+		members = {memberName: (start, end) for memberName, start, end in index["members"]}
+		restored = {}
+		for reference, kind, target in dearchiver.unresolved:
+			if target in restored:
+				dearchiver.restore(reference, kind, restored[target])
+				continue
+			dearchiver.renames[target] = reference
+			extract(*members[target])
+			restored[target] = reference
+		dearchiver.unresolved = []
+	readbuffer.close()
+	dearchiver.close()
+	return count
+
+
+class ContainerUnitTest(unittest.TestCase):
+	def setUp(self):
+		self.srcfile = "../test.txt"
+
+	def tearDown(self):
+		pass
+
+	def test_chunks(self):
+		fin = open(self.srcfile, "rb")
+		ba = fin.read(20000)
+		fin.close()
+		for workers in [1, 2]:
+			chunkEncoder = ChunkEncoder("password", 3000, workers)
+			encoded = bytearray()
+			for i in range(0, len(ba), 700):
+				encoded += chunkEncoder.encode(ba[i:i+700])
+			encoded += chunkEncoder.close()
+			self.assertTrue(isContainer(encoded))
+			chunkDecoder = ChunkDecoder("password", workers)
+			decoded = bytearray()
+			for i in range(0, len(encoded), 1000):
+				decoded += chunkDecoder.decode(encoded[i:i+1000])
+			decoded += chunkDecoder.close()
+			self.assertTrue(decoded == ba)
+			chunkDecoder = ChunkDecoder("wrong", workers)
+			with self.assertRaises(ValueError):
+				chunkDecoder.decode(encoded)
+				chunkDecoder.close()
+
+	def test_truncated(self):
+		chunkEncoder = ChunkEncoder("password", 1000)
+		encoded = chunkEncoder.encode(os.urandom(1500))+chunkEncoder.close()
+		chunkDecoder = ChunkDecoder("password")
+		chunkDecoder.decode(encoded[:-FRAMEHEADERSIZE])
+		with self.assertRaises(ValueError):
+			chunkDecoder.close()
+
+	def test_member(self):
+		testfolder = "../test"
+		srcfile = "../test.txt"
+		os.makedirs("../test/folder/sub")
+		fin = open(srcfile, "rb")
+		ba = fin.read(30000)
+		fin.close()
+		for i in range(3):
+			fout = open("../test/folder/test"+str(i)+".txt", "wb")
+			fout.write(ba[i*10000:(i+1)*10000])
+			fout.close()
+		shutil.copy("../test/folder/test1.txt", "../test/folder/sub/test3.txt")
+		for dedup in [False, True]:
+			shutil.rmtree("../test/output", ignore_errors=True)
+			archiver = Archiver("../test/folder", dedup=dedup)
+			chunkEncoder = ChunkEncoder("password", 4000, 1, archiver.members)
+			archivefile = "../test/folder.edoc"
+			fout = open(archivefile, "wb")
+			while True:
+				data = archiver.read()
+				if len(data) == 0:
+					break
+				fout.write(chunkEncoder.encode(data))
+			fout.write(chunkEncoder.close())
+			fout.close()
+			self.assertTrue((archiver.members[-1].flags == REFERENCE) == dedup)
+			count = extractMembers(archivefile, "password", "folder"+os.sep+"test1.txt", Dearchiver("../test/output"))
+			self.assertTrue(count == 1)
+			self.assertTrue(os.listdir("../test/output/folder") == ["test1.txt"])
+			fin = open("../test/output/folder/test1.txt", "rb")
+			self.assertTrue(fin.read() == ba[10000:20000])
+			fin.close()
+			count = extractMembers(archivefile, "password", "folder"+os.sep+"sub", Dearchiver("../test/output"))
+			self.assertTrue(count == 1)
+			fin = open("../test/output/folder/sub/test3.txt", "rb")
+			self.assertTrue(fin.read() == ba[10000:20000])
+			fin.close()
+			self.assertTrue(extractMembers(archivefile, "password", "missing", Dearchiver("../test/output")) == 0)
+			with self.assertRaises(ValueError):
+				extractMembers(archivefile, "wrong", "folder", Dearchiver("../test/output"))
+		shutil.rmtree(testfolder)
\ No newline at end of file
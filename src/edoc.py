@@ -3,53 +3,26 @@ import sys
 import time
 import unittest
 import os
-import math
-
-from archiver import Archiver, Dearchiver
-from compressor import Compressor, Decompressor
-from encoder import Encoder, Decoder
-from filebuffer import WriteBuffer, ReadBuffer
-
-
-def printProgress():
-	now = time.time()
-	end = 0
-	if (progress != 0):
-		end = targetprogress*(float(now-start)/progress)
-		end -= (now-start)
-	h = math.floor(end/3600)
-	m = math.floor((end-h*3600)/60)
-	s = math.floor(end-h*3600-m*60)
-	h = str(h)
-	m = str(m)
-	s = str(s)
-	if (len(h) == 1):
-		h = "0"+h
-	if (len(m) == 1):
-		m = "0"+m
-	if (len(s) == 1):
-		s = "0"+s
-	print(str(round(progress*1000/targetprogress)/10)+"% "+h+":"+m+":"+s, end="\r")
-
-def getSize(folder):
-	if (os.path.isfile(folder)):
-		return os.stat(folder).st_size
-	size = 0
-	files = os.listdir(folder)
-	for file in files:
-		file = folder+"/"+file
-		if (os.path.isfile(file)):
-			size += getSize(file)
-		elif (os.path.isdir(file)):
-			size += getSize(file)
-	return size
+import getpass
+
+from archiver import Archiver, Dearchiver, STREAM
+from codec import CODECS, FRAMESIZE, createCompressor, CodecDecompressor
+from compressor import POLICIES, MINWIDTH, MAXWIDTH
+from container import ChunkEncoder, ChunkDecoder, isContainer, extractMembers, readRecords
+from encoder import Encoder, Decoder, ENGINES
+from filebuffer import WriteBuffer, ReadBuffer, MMapReadBuffer, openReadBuffer
+from log import getLog
+from manifest import Manifest
+from pipeline import Pipeline, Stage
+from progress import Progress, MODES, SILENT, TEXT
+
+# number of bytes read per call from the archived files while encoding and from the archive while decoding
+READSIZE = 1024*1024
+
 
 if __name__ == "__main__":
-	useCurses = True
 	profiling = False
 
-	if useCurses:
-		import curses
 	if profiling:
 		import cProfile
 		import pstats
@@ -58,18 +31,71 @@ if __name__ == "__main__":
 	parser = argparse.ArgumentParser(description="Encodes or decodes a file or folder.")
 	parser.add_argument("-e", "--encode", action="store_true", help="Specify mode: encode")
 	parser.add_argument("-d", "--decode", action="store_true", help="Specify mode: decode")
+	parser.add_argument("-r", "--restore", nargs="+", metavar="archive", help="Specify mode: decode a base archive and its incremental archives in order into the output folder, the archives are kept.")
 	parser.add_argument("-p", "--password", action="store", metavar="password", help="Specify password.")
-	parser.add_argument("-f", "--file", help="Specify file/folder.")
+	parser.add_argument("-f", "--file", help="Specify file/folder, - reads from stdin.")
+	parser.add_argument("-o", "--output", help="Specify the encoded file or the folder to decode to, - writes to stdout.")
+	parser.add_argument("-m", "--member", help="Specify a file or folder within the archive to decode, the encoded file is kept.")
+	parser.add_argument("-n", "--name", default="stdin", help="Specify the name of the file read from stdin.")
 	parser.add_argument("-t", "--test", action="store_true", help="Runs unittests.")
+	parser.add_argument("--progress", choices=MODES, default=TEXT, help="Specify how the progress is reported to stderr: text, json lines for other programs or silent.")
+	parser.add_argument("--pipeline", action="store_true", help="Run reading, compression, encryption and writing in parallel threads.")
+	parser.add_argument("--queuesize", type=int, default=16, metavar="chunks", help="Specify the number of chunks buffered between pipeline threads.")
+	parser.add_argument("-c", "--chunksize", type=int, default=1024*1024, metavar="bytes", help="Specify the size of independently encoded chunks, 0 writes a single stream.")
+	parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="Specify the number of processes encoding or decoding chunks.")
+	parser.add_argument("--writers", type=int, default=8, help="Specify the number of threads writing decoded files, 0 writes them in the decoding thread.")
+	parser.add_argument("--no-mmap", action="store_true", help="Read encoded files without a memory map.")
+	parser.add_argument("--codec", choices=CODECS.keys(), default="lzw", help="Specify the compression, store does not compress.")
+	parser.add_argument("--level", type=int, metavar="level", help="Specify the compression level of zlib (0-9), bz2 (1-9) and lzma (0-9).")
+	parser.add_argument("--incremental", nargs="?", const="", metavar="previous", help="Keep the files and store a manifest in the archive, with the previous archive only new and changed files and deletions are archived.")
+	parser.add_argument("--dedup", action="store_true", help="Archive files with the content of an archived file and hard links as references.")
+	parser.add_argument("--framesize", type=int, default=FRAMESIZE, metavar="bytes", help="Specify the size of frames that are stored if they do not compress, 0 compresses everything.")
+	parser.add_argument("--dictbits", type=int, default=16, choices=range(MINWIDTH, MAXWIDTH+1), metavar="bits", help="Specify the width of the largest code, the dictionary holds 2**bits phrases.")
+	parser.add_argument("--policy", choices=POLICIES.keys(), default="freeze", help="Specify what happens to a full dictionary: freeze keeps it, reset clears it, adaptive clears it when the compression ratio drops.")
+	parser.add_argument("--threshold", type=int, default=75, choices=range(0, 101), metavar="percent", help="Specify the ratio in percent of the best ratio below which adaptive clears the dictionary.")
+	parser.add_argument("--engine", choices=ENGINES, default="auto", help="Specify the implementation of the SPBox, auto uses numpy if it is installed.")
+	parser.add_argument("-b", "--buffersize", type=int, default=4*1024*1024, metavar="bytes", help="Specify the flush threshold of written files.")
 	args = vars(parser.parse_args())
 	file = args["file"]
+	output = args["output"]
+	member = args["member"]
 	password = args["password"]
 	encodeMode = args["encode"]
 	testMode = args["test"]
-	root = None
-	progress = 0
-	targetprogress = getSize(file)
-	start = 0
+	buffersize = args["buffersize"]
+	useMMap = not args["no_mmap"]
+	threaded = args["pipeline"]
+	queuesize = args["queuesize"]
+	chunksize = args["chunksize"]
+	workers = args["workers"]
+	engine = args["engine"]
+	compression = {"codec": args["codec"]}
+	levels = CODECS[args["codec"]].levels
+	if args["level"] is not None and levels is None:
+		parser.error("argument --level: "+args["codec"]+" has no levels")
+	if args["level"] is not None and args["level"] not in levels:
+		parser.error("argument --level: "+args["codec"]+" needs a level from "+str(levels[0])+" to "+str(levels[-1]))
+	if args["codec"] == "lzw":
+		compression.update({"maxwidth": args["dictbits"], "policy": POLICIES[args["policy"]], "threshold": args["threshold"]})
+	elif args["level"] is not None:
+		compression["level"] = args["level"]
+	estimate = args["framesize"] > 0 and args["codec"] != "store"
+	if estimate:
+		compression = {"codec": "framed", "compression": compression, "framesize": args["framesize"]}
+	restore = args["restore"]
+	incremental = args["incremental"]
+	manifest = Manifest(file) if encodeMode and file is not None and restore is None else None
+	total = 0
+	# silent runs do not walk the tree in advance, the Archiver scans it while it reads
+	if args["progress"] != SILENT:
+		if restore is not None:
+			total = sum(os.stat(archive).st_size for archive in restore)
+		elif manifest is not None:
+			total = manifest.walk()
+		elif not encodeMode and file is not None and file != STREAM:
+			# a member is extracted from a part of the archive only, so its total is unknown
+			total = os.stat(file).st_size if member is None else 0
+	progress = Progress(total, ["read"], args["progress"])
 	pr = None
 	if testMode:
 		unittest.main(argv=[sys.argv[0]])
@@ -77,66 +103,150 @@ if __name__ == "__main__":
 		exit()
 	else:
 		if password is None:
-			password = input("Enter password: ")
-			if useCurses:
-				window = curses.initscr()
-				window.clear()
-				window.refresh()
+			password = getpass.getpass("Enter password: ")
 		if password is not None:
 			if profiling:
 				pr = cProfile.Profile()
 				pr.enable()
-			start = time.time()
-			if encodeMode:
-				archiver = Archiver(file, True)
-				compressor = Compressor()
-				encoder = Encoder(password)
-				writebuffer = WriteBuffer(file+".edoc")
-				while True:
-					printProgress()
-					breakcondition = False
-					data = archiver.read()
-					datalen = len(data)
-					progress += datalen
-					if datalen == 0:
-						breakcondition = True
-					data = compressor.compress(data)
-					data = encoder.encode(data)
-					writebuffer.write(data)
-					if breakcondition:
-						break
-				data = compressor.close()
-				data = encoder.encode(data)
-				data1 = encoder.close()
-				writebuffer.write(data)
-				writebuffer.write(data1)
+
+			# silent runs use sources, stages and sinks as they are, so counting costs nothing
+			def countedSource(source):
+				if progress.mode == SILENT:
+					return source
+
+				def read():
+					data = source()
+					progress.update("read", len(data))
+					return data
+				return read
+
+			def countedSink(sink):
+				if progress.mode == SILENT:
+					return sink
+
+				progress.addStage("write")
+
+				def write(data):
+					sink(data)
+					progress.update("write", len(data))
+				return write
+
+			# a stage counts the bytes it takes in
+			def countedStage(name, stage):
+				if progress.mode == SILENT:
+					return stage
+				progress.addStage(name)
+				process = stage.process
+
+				def counted(data):
+					converted = process(data)
+					progress.update(name, len(data))
+					return converted
+				return Stage(counted, stage.close)
+
+			def decodeArchive(readbuffer, dearchiver):
+				# views of a ReadBuffer are overwritten by the next read, so a reader running ahead needs copies
+				stableViews = not threaded or isinstance(readbuffer, MMapReadBuffer)
+
+				def readChunk():
+					if stableViews:
+						return readbuffer.readview(READSIZE)
+					return readbuffer.read(READSIZE)
+
+				read = countedSource(readChunk)
+				head = [read()]
+
+				def source():
+					if len(head) > 0:
+						return head.pop()
+					return read()
+
+				decompressor = None
+				if isContainer(head[0]):
+					chunkDecoder = ChunkDecoder(password, workers, engine)
+					stages = [countedStage("decode", Stage(chunkDecoder.decode, chunkDecoder.close))]
+				else:
+					decoder = Decoder(password, engine)
+					decompressor = CodecDecompressor()
+					stages = [countedStage("decrypt", Stage(decoder.decode, decoder.close)), countedStage("decompress", Stage(decompressor.decompress, decompressor.close))]
+				Pipeline(source, stages, countedSink(dearchiver.write), queuesize).run(threaded)
+				readbuffer.close()
+				dearchiver.close(decompressor is not None and decompressor.isLegacy())
+				getLog().info("wrote "+str(dearchiver.bytesWritten)+" bytes in "+str(dearchiver.flushes)+" flushes")
+
+			if restore is not None:
+				if output is None:
+					output = "."
+				for archive in restore:
+					getLog().info("restore "+archive)
+					try:
+						decodeArchive(openReadBuffer(archive, useMMap=useMMap), Dearchiver(output, buffersize, args["writers"]))
+					except ValueError as e:
+						getLog().error(archive+" is not restored: "+str(e))
+						exit(1)
+			elif encodeMode:
+				previous = None
+				if incremental is not None:
+					if file == STREAM or chunksize == 0:
+						getLog().error("incremental archives need a file or folder and chunks")
+						exit(1)
+					if incremental != "":
+						previous = readRecords(incremental, password, engine)
+					if output is None:
+						output = file+time.strftime(".%Y%m%d%H%M%S")+".edoc"
+				if output is None:
+					output = STREAM if file == STREAM else file+".edoc"
+				# bad compression options fail here, before any file is read or deleted
+				compressor = createCompressor(**compression)
+				archiver = Archiver(file, file != STREAM and incremental is None, args["name"], estimate, manifest, args["dedup"], incremental is not None, previous, READSIZE)
+				writebuffer = WriteBuffer(sys.stdout.buffer if output == STREAM else output, buffersize)
+
+				if chunksize > 0:
+					chunkEncoder = ChunkEncoder(password, chunksize, workers, archiver.members, engine, compression, archiver.records)
+					stages = [countedStage("encode", Stage(chunkEncoder.encode, chunkEncoder.close))]
+				else:
+					encoder = Encoder(password, engine)
+					stages = [countedStage("compress", Stage(compressor.compress, compressor.close)), countedStage("encrypt", Stage(encoder.encode, encoder.close))]
+				Pipeline(countedSource(archiver.read), stages, countedSink(writebuffer.write), queuesize).run(threaded)
 				writebuffer.close()
+				getLog().info("wrote "+str(writebuffer.bytesWritten)+" bytes in "+str(writebuffer.flushes)+" flushes")
 			else:
-				readbuffer = ReadBuffer(file)
-				decoder = Decoder(password)
-				decompressor = Decompressor()
-				dearchiver = Dearchiver(file[:-5])
-				while True:
-					printProgress()
-					breakcondition = False
-					data = readbuffer.read()
-					datalen = len(data)
-					progress += datalen
-					if datalen == 0:
-						breakcondition = True
-					data = decoder.decode(data)
-					data = decompressor.decompress(data)
-					dearchiver.write(data)
-					if breakcondition:
-						break
-				readbuffer.close()
-				data = decoder.close()
-				data = decompressor.decompress(data)
-				data1 = decompressor.close()
-				dearchiver.write(data)
-				dearchiver.write(data1)
-				os.remove(file)
-			printProgress()
+				if output is None:
+					output = os.path.dirname(file) if file != STREAM else ""
+					if output == "":
+						output = "."
+				if member is not None:
+					dearchiver = Dearchiver(output, buffersize, args["writers"])
+					try:
+						count = extractMembers(file, password, member, dearchiver, engine)
+					except ValueError as e:
+						getLog().error(member+" is not decoded from "+file+": "+str(e))
+						exit(1)
+					getLog().info("decoded "+str(count)+" files")
+					if count == 0:
+						getLog().error(member+" is not in "+file)
+						exit(1)
+					# only the chunks of the member are read, so the report only has the written bytes
+					progress.addStage("write")
+					progress.update("write", dearchiver.bytesWritten)
+				else:
+					if file == STREAM:
+						readbuffer = ReadBuffer(sys.stdin.buffer)
+					else:
+						readbuffer = openReadBuffer(file, useMMap=useMMap)
+					dearchiver = Dearchiver(output, buffersize, args["writers"])
+					try:
+						decodeArchive(readbuffer, dearchiver)
+					except ValueError as e:
+						if file == STREAM:
+							getLog().error("stdin is not decoded: "+str(e))
+						else:
+							getLog().error(file+" is not decoded and kept: "+str(e))
+						exit(1)
+					# the archive is only removed after all of it is decoded
+					if file != STREAM:
+						os.remove(file)
+			progress.close()
 			if profiling:
 				pr.disable()
 				s = io.StringIO()
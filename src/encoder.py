@@ -1,9 +1,134 @@
 from random import randint
 import unittest
-from typing import Dict, Tuple, List
+from typing import Tuple, List
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+ENGINES = ["auto", "python", "numpy"]
+BLOCKMASK = (1 << 2048)-1
+LOWNIBBLE = bytes([i & 15 for i in range(256)])
+HIGHNIBBLE = bytes([i >> 4 for i in range(256)])
+
+
+def createSPBox(pw: bytearray, engine: str="auto") -> "SPBox":
+	"""
+	Creates the SPBox of an engine.
+
+	Parameters:
+		pw: password
+		engine: "python", "numpy" or "auto" to use numpy if it is installed
+
+	Returns:
+		SPBox or NumpySPBox
+
+	| **Pre:**
+	|	len(pw) == 4096
+	|	engine in ENGINES
+	"""
+	if engine == "numpy" or (engine == "auto" and numpy is not None):
+		return NumpySPBox(pw)
+	return SPBox(pw)
+
+def keySchedule(pw: bytearray, size: int) -> List[int]:
+	"""
+	Places the numbers 0 to size-1 into a lookuptable by the password.
+
+	Parameters:
+		pw: password
+		size: length of the lookuptable
+
+	Returns:
+		lookuptable, number i is placed at the (1+pw[i]%(size-i))-th empty slot counted from the slot of number i-1
+
+	| **Pre:**
+	|	len(pw) >= size
+	|	size is a power of 2
+
+	| **Post:**
+	|	len(return) == size
+	|	return contains every number from 0 to size-1
+
+	Note:
+		The empty slots are counted in a fenwick tree, so each number is placed in O(log(size)).
+	"""
+	table = [-1]*size
+	tree = [0]*(size+1)
+	for i in range(1, size+1):
+		tree[i] += 1
+		parent = i+(i & -i)
+		if parent <= size:
+			tree[parent] += tree[i]
+	index = 0
+	for i in range(size):
+		targetEmpty = 1+(pw[i] % (size-i))
+		# empty slots in front of index
+		before = 0
+		j = index
+		while j > 0:
+			before += tree[j]
+			j -= j & -j
+		if targetEmpty <= size-i-before:
+			targetEmpty += before
+		else:
+			targetEmpty -= size-i-before
+		# position of the targetEmpty-th empty slot
+		index = 0
+		step = size
+		while step > 0:
+			if index+step <= size and tree[index+step] < targetEmpty:
+				index += step
+				targetEmpty -= tree[index]
+			step >>= 1
+		table[index] = i
+		j = index+1
+		while j <= size:
+			tree[j] -= 1
+			j += j & -j
+	return table
+
+
+def splitBlocks(buffer: bytearray, data: bytearray) -> Tuple[List[memoryview], bytearray]:
+	"""
+	Splits data into blocks of 256 numbers.
+
+	Parameters:
+		buffer: numbers of an unfinished block of the previous call or None
+		data: data
+
+	Returns:
+		views of all complete blocks and the numbers of the unfinished block or None
+
+	| **Pre:**
+	|	buffer is None or len(buffer) <= 256
+
+	| **Post:**
+	|	return[1] is None or len(return[1]) < 256
+
+	Note:
+		Blocks are sliced from a memoryview at increasing offsets and only the unfinished block is copied,
+		so the cost is linear in len(data).
+	"""
+	view = memoryview(data)
+	blocks = []
+	offset = 0
+	if buffer is not None:
+		offset = min(256-len(buffer), len(view))
+		buffer += view[:offset]
+		if len(buffer) < 256:
+			return blocks, buffer
+		blocks.append(memoryview(buffer))
+	end = offset+(len(view)-offset)//256*256
+	for start in range(offset, end, 256):
+		blocks.append(view[start:start+256])
+	if end < len(view):
+		return blocks, bytearray(view[end:])
+	return blocks, None
+
 
 class Encoder:
-	def __init__(self, pw: str):
+	def __init__(self, pw: str, engine: str="auto"):
 		password = bytearray()
 		for c in pw:
 			password.append(ord(c))
@@ -11,34 +136,35 @@ class Encoder:
 		while len(password) < 4096:
 			password.append(ord(pw[index%len(pw)]))
 			index += 1
-		self.spBox = SPBox(password)
+		self.spBox = createSPBox(password, engine)
+		self.buffer = None
+		self.seeded = False
+	def reset(self):
+		seed = bytearray(256)
+		for i in range(256):
+			seed[i] = randint(1, 255)
+		self.spBox.setSeed(seed)
 		self.buffer = None
 		self.seeded = False
 	def encode(self, plain: bytearray):
 		returnvalue = bytearray()
-		if self.buffer is not None:
-			plain = self.buffer+plain
-			self.buffer = None
 		if (not self.seeded):
 			ba = self.spBox.getSeed()
 			returnvalue.extend(ba)
 			self.seeded = True
-		while len(plain) >= 256:
-			ba = bytearray()
-			for i in range(256):
-				ba.append(plain.pop(0))
-			encoded = self.spBox.encode(ba)
-			returnvalue.extend(encoded)
-		if len(plain) > 0:
-			self.buffer = plain
+		blocks, self.buffer = splitBlocks(self.buffer, plain)
+		for block in blocks:
+			returnvalue.extend(self.spBox.encode(block))
 		return returnvalue
 	def close(self):
+		if self.buffer is None:
+			return bytearray()
 		while len(self.buffer) < 256:
 			self.buffer.append(randint(0, 255))
 		return self.encode(bytearray())
 
 class Decoder:
-	def __init__(self, pw: str):
+	def __init__(self, pw: str, engine: str="auto"):
 		password = bytearray()
 		for c in pw:
 			password.append(ord(c))
@@ -46,26 +172,21 @@ class Decoder:
 		while len(password) < 4096:
 			password.append(ord(pw[index%len(pw)]))
 			index += 1
-		self.spBox = SPBox(password)
+		self.spBox = createSPBox(password, engine)
+		self.buffer = None
+		self.seeded = False
+	def reset(self):
 		self.buffer = None
 		self.seeded = False
 	def decode(self, encoded: bytearray):
 		returnvalue = bytearray()
-		if self.buffer is not None:
-			encoded = self.buffer+encoded
-			self.buffer = None
-		while len(encoded) >= 256:
-			ba = bytearray()
-			for i in range(256):
-				ba.append(encoded.pop(0))
+		blocks, self.buffer = splitBlocks(self.buffer, encoded)
+		for block in blocks:
 			if (self.seeded):
-				decoded = self.spBox.decode(ba)
-				returnvalue.extend(decoded)
+				returnvalue.extend(self.spBox.decode(block))
 			else:
-				self.spBox.setSeed(ba)
+				self.spBox.setSeed(block)
 				self.seeded = True
-		if len(encoded) > 0:
-			self.buffer = encoded
 		return returnvalue
 	def close(self):
 		return bytearray()
@@ -94,19 +215,8 @@ class SBox:
 	"""
 
 	def __init__(self, pw: bytearray):
-		self.encodeMap: List[int] = [-1]*256
+		self.encodeMap: List[int] = keySchedule(pw, 256)
 		self.decodeMap: List[int] = [-1]*256
-		index = 0
-		for i in range(256):
-			emptyCounter = 0
-			maxEmpty = 256-i
-			targetEmpty = 1+(pw[i]%maxEmpty)
-			while (emptyCounter < targetEmpty):
-				if (self.encodeMap[index] == -1):
-					emptyCounter += 1
-				if (emptyCounter < targetEmpty):
-					index = (index+1)%256
-			self.encodeMap[index] = i
 		for i in range(256):
 			self.decodeMap[self.encodeMap[i]] = i
 
@@ -157,6 +267,8 @@ class PBox:
 	Attributes:
 		encodeMap: lookuptable used to encode data
 		decodeMap: lookuptable used to decode data
+		encodeNibbles: bits set by encodeMap for every nibble of a block, low nibbles first
+		decodeNibbles: bits set by decodeMap for every nibble of a block, low nibbles first
 
 	Parameters:
 		pw: password
@@ -171,24 +283,60 @@ class PBox:
 	|	len(self.decodeMap) == 2048
 	|	self.decodeMap[i] >= 0
 	|	self.decodeMap[i] < 2048
+	|	len(self.encodeNibbles) == 512
+	|	len(self.decodeNibbles) == 512
+
+	Note:
+		A block is handled as a little endian number of 2048 bits.
+		The seed rotates this number, so the nibble tables are shared by all seeds.
 	"""
 
 	def __init__(self, pw: bytearray):
-		self.encodeMap: List[int] = [-1]*(256*8)
+		self.encodeMap: List[int] = keySchedule(pw, 256*8)
 		self.decodeMap: List[int] = [-1]*(256*8)
-		index = 0
-		for i in range(256*8):
-			emptyCounter = 0
-			maxEmpty = 256*8-i
-			targetEmpty = 1+(pw[i]%maxEmpty)
-			while (emptyCounter < targetEmpty):
-				if (self.encodeMap[index] == -1):
-					emptyCounter += 1
-				if (emptyCounter < targetEmpty):
-					index = (index+1)%(256*8)
-			self.encodeMap[index] = i
 		for i in range(256*8):
 			self.decodeMap[self.encodeMap[i]] = i
+		self.encodeNibbles: List[List[int]] = self.nibbles(self.encodeMap)
+		self.decodeNibbles: List[List[int]] = self.nibbles(self.decodeMap)
+
+	@staticmethod
+	def nibbles(bitMap: List[int]) -> List[List[int]]:
+		"""
+		Creates the lookuptables of all nibbles of a block.
+
+		Parameters:
+			bitMap: target of every bit
+
+		Returns:
+			numbers with the targets of the set bits of every nibble value, all low nibbles followed by all high nibbles
+
+		| **Pre:**
+		|	len(bitMap) == 2048
+		"""
+		tables = []
+		for shift in [0, 4]:
+			for i in range(256):
+				table = [0]*16
+				for value in range(1, 16):
+					bit = (value & -value).bit_length()-1
+					table[value] = table[value & (value-1)] | (1 << bitMap[i*8+shift+bit])
+				tables.append(table)
+		return tables
+
+	@staticmethod
+	def permute(tables: List[List[int]], block: bytes) -> int:
+		"""
+		Moves all bits of a block to their targets.
+
+		Parameters:
+			tables: lookuptables of all nibbles
+			block: block of numbers
+
+		Returns:
+			permuted block as number
+		"""
+		nibbles = block.translate(LOWNIBBLE)+block.translate(HIGHNIBBLE)
+		return sum(map(list.__getitem__, tables, nibbles))
 
 	def encode(self, plain: bytearray, seed: int) -> bytearray:
 		"""
@@ -211,15 +359,10 @@ class PBox:
 		|	return[i] >= 0
 		|	return[i] < 256
 		"""
-		encoded = bytearray(256)
-		for i in range(256):
-			indexVar = i*8+seed
-			for b in range(8):
-				if ((plain[i]) & (1<<b)):
-					index = self.encodeMap[(b+indexVar)%2048]
-					index8 = int(index/8)
-					encoded[index8] = encoded[index8]+(1<<(index%8))
-		return encoded
+		number = int.from_bytes(plain, "little")
+		number = ((number << seed) | (number >> (2048-seed))) & BLOCKMASK
+		encoded = self.permute(self.encodeNibbles, number.to_bytes(256, "little"))
+		return bytearray(encoded.to_bytes(256, "little"))
 
 	def decode(self, encoded: bytearray, seed: int) -> List[int]:
 		"""
@@ -242,17 +385,9 @@ class PBox:
 		|	return[i] >= 0
 		|	return[i] < 256
 		"""
-		decoded = bytearray(256)
-		for i in range(256):
-			indexVar = i*8
-			for b in range(8):
-				if ((encoded[i]) & (1<<b)):
-					index = self.decodeMap[indexVar+b]-seed
-					if (index < 0):
-						index += 2048
-					index8 = int(index/8)
-					decoded[index8] = decoded[index8]+(1<<(index%8))
-		return decoded
+		number = self.permute(self.decodeNibbles, bytes(encoded))
+		number = ((number >> seed) | (number << (2048-seed))) & BLOCKMASK
+		return bytearray(number.to_bytes(256, "little"))
 
 class SPBox:
 	"""
@@ -262,6 +397,8 @@ class SPBox:
 		sBoxes: list of SBoxes used for substitution
 		seed: seed
 		pBox: PBox used for permutation
+		encodeTables: lookuptables of the SBoxes selected by each seed number, applied in order
+		decodeTables: inverse lookuptables of encodeTables
 
 	Parameters:
 		pw: password
@@ -276,6 +413,11 @@ class SPBox:
 	|	len(self.sBoxes) == 8
 	|	len(self.seed) == 256
 	|	self.seed[i] >= 1
+	|	len(self.encodeTables) == 256
+	|	len(self.decodeTables) == 256
+
+	Note:
+		encodeTables[s] is built from encodeTables[s] without its highest bit, so each table costs one translate.
 	"""
 
 	def __init__(self, pw: bytearray, seed: bytearray = None):
@@ -294,6 +436,12 @@ class SPBox:
 		for i in range(2048):
 			ppw[i] = pw[8*256+i]
 		self.pBox: PBox = PBox(ppw)
+		self.encodeTables: List[bytes] = [bytes(range(256))]
+		self.decodeTables: List[bytes] = [bytes(range(256))]
+		for s in range(1, 256):
+			j = s.bit_length()-1
+			self.encodeTables.append(self.encodeTables[s ^ (1<<j)].translate(bytes(self.sBoxes[j].encodeMap)))
+			self.decodeTables.append(bytes(self.sBoxes[j].decodeMap).translate(self.decodeTables[s ^ (1<<j)]))
 
 	def encodeRound(self, plain: bytearray, round: int, pSeed: int) -> bytearray:
 		"""
@@ -318,13 +466,11 @@ class SPBox:
 		|	len(return) == 256
 		"""
 		encoded = bytearray(256)
+		encodeMap = self.sBoxes[round].encodeMap
+		encodeTables = self.encodeTables
 		for i in range(256):
 			seedAtI = self.seed[i]
-			encoded[i] = plain[i] ^ self.sBoxes[round].encodeMap[i] ^ seedAtI
-			for j in range(8):
-				if ((seedAtI & (1<<j)) != 0):
-					encoded[i] = self.sBoxes[j].encodeMap[
-						encoded[i]]  # replacement for SBox.encode() to improve performance
+			encoded[i] = encodeTables[seedAtI][plain[i] ^ encodeMap[i] ^ seedAtI]
 		encoded = self.pBox.encode(encoded, pSeed)
 		return encoded
 
@@ -351,14 +497,11 @@ class SPBox:
 		|	len(return) == 256
 		"""
 		decoded = self.pBox.decode(encoded, pSeed)
+		encodeMap = self.sBoxes[round].encodeMap
+		decodeTables = self.decodeTables
 		for i in range(256):
 			seedAtI = self.seed[i]
-			for invertedJ in range(8):
-				j = 8-1-invertedJ
-				if ((seedAtI & (1<<j)) != 0):
-					decoded[i] = self.sBoxes[j].decodeMap[
-						decoded[i]]  # replacement for SBox.decode() to improve performance
-			decoded[i] = decoded[i] ^ self.sBoxes[round].encodeMap[i] ^ seedAtI
+			decoded[i] = decodeTables[seedAtI][decoded[i]] ^ encodeMap[i] ^ seedAtI
 		return decoded
 
 	def encode(self, plain: bytearray) -> bytearray:
@@ -461,6 +604,159 @@ class SPBox:
 		for i in range(256):
 			self.seed[i] = seed[i]
 
+class NumpySPBox(SPBox):
+	"""
+	NumpySPBox is a SPBox that processes whole blocks with numpy.
+
+	Attributes:
+		sEncode: encodeMaps of all SBoxes
+		tEncode: encodeTables indexed by seed number and plain number
+		tDecode: decodeTables indexed by seed number and encoded number
+		pEncode: encodeMap of the PBox
+		pDecode: decodeMap of the PBox
+		bitIndex: index of every bit of a block
+
+	Parameters:
+		pw: password
+		seed: seed
+
+	| **Pre:**
+	|	numpy is not None
+	|	len(pw) == 4096
+	|	len(seed) == 256
+	|	seed[i] >= 1
+
+	| **Post:**
+	|	self.sEncode.shape == (8, 256)
+	|	self.tEncode.shape == (256, 256)
+	|	self.tDecode.shape == (256, 256)
+	|	self.pEncode.shape == (2048,)
+	|	self.pDecode.shape == (2048,)
+
+	Note:
+		The output is identical to the output of SPBox.
+	"""
+
+	def __init__(self, pw: bytearray, seed: bytearray = None):
+		super().__init__(pw, seed)
+		self.sEncode = numpy.array([sBox.encodeMap for sBox in self.sBoxes], dtype=numpy.uint8)
+		self.tEncode = numpy.frombuffer(b"".join(self.encodeTables), dtype=numpy.uint8).reshape(256, 256)
+		self.tDecode = numpy.frombuffer(b"".join(self.decodeTables), dtype=numpy.uint8).reshape(256, 256)
+		self.pEncode = numpy.array(self.pBox.encodeMap, dtype=numpy.uint16)
+		self.pDecode = numpy.array(self.pBox.decodeMap, dtype=numpy.uint16)
+		self.bitIndex = numpy.arange(2048, dtype=numpy.uint16)
+
+	def encodeRound(self, plain, round: int, pSeed: int, seed=None):
+		"""
+		Encodes a block of plain numbers.
+
+		Parameters:
+			plain: block of plain numbers as uint8 array
+			round: iteration of encode
+			pSeed: seed for PBox
+			seed: seed as uint8 array
+
+		Returns:
+			block of encoded numbers as uint8 array
+
+		| **Pre:**
+		|	len(plain) == 256
+		|	round >= 0
+		|	round < 8
+		|	pSeed >= 0
+		|	pSeed < 256
+		"""
+		if seed is None:
+			seed = numpy.frombuffer(bytes(self.seed), dtype=numpy.uint8)
+		encoded = self.tEncode[seed, plain ^ self.sEncode[round] ^ seed]
+		bits = numpy.unpackbits(encoded, bitorder="little")
+		return numpy.packbits(bits[(self.pDecode-pSeed) % 2048], bitorder="little")
+
+	def decodeRound(self, encoded, round: int, pSeed: int, seed=None):
+		"""
+		Decodes a block of encoded numbers.
+
+		Parameters:
+			encoded: block of encoded numbers as uint8 array
+			round: iteration of decode
+			pSeed: seed for PBox
+			seed: seed as uint8 array
+
+		Returns:
+			block of decoded numbers as uint8 array
+
+		| **Pre:**
+		|	len(encoded) == 256
+		|	round >= 0
+		|	round < 8
+		|	pSeed >= 0
+		|	pSeed < 256
+		"""
+		if seed is None:
+			seed = numpy.frombuffer(bytes(self.seed), dtype=numpy.uint8)
+		bits = numpy.unpackbits(encoded, bitorder="little")
+		decoded = numpy.packbits(bits[self.pEncode[(self.bitIndex+pSeed) % 2048]], bitorder="little")
+		return self.tDecode[seed, decoded] ^ self.sEncode[round] ^ seed
+
+	def encode(self, plain: bytearray) -> bytearray:
+		"""
+		Encodes a block of plain numbers.
+
+		Parameters:
+			plain: block of plain numbers
+
+		Returns:
+			block of encoded numbers
+
+		| **Pre:**
+		|	len(plain) == 256
+
+		| **Post:**
+		|	len(return) == 256
+
+		| **Modifies:**
+		|	self.seed[i]
+		"""
+		seed = numpy.frombuffer(bytes(self.seed), dtype=numpy.uint8)
+		pSeed = int(seed.sum()) % 256
+		plainArray = numpy.frombuffer(bytes(plain), dtype=numpy.uint8)
+		encoded = plainArray
+		for i in range(8):
+			encoded = self.encodeRound(encoded, i, pSeed, seed)
+		seed = plainArray ^ seed
+		seed[seed == 0] = 1
+		self.seed[:] = seed.tobytes()
+		return bytearray(encoded.tobytes())
+
+	def decode(self, encoded: bytearray) -> bytearray:
+		"""
+		Decodes a block of encoded numbers.
+
+		Parameters:
+			encoded: block of encoded numbers
+
+		Returns:
+			block of decoded numbers
+
+		| **Pre:**
+		|	len(encoded) == 256
+
+		| **Post:**
+		|	len(return) == 256
+
+		| **Modifies:**
+		|	self.seed[i]
+		"""
+		seed = numpy.frombuffer(bytes(self.seed), dtype=numpy.uint8)
+		pSeed = int(seed.sum()) % 256
+		decoded = numpy.frombuffer(bytes(encoded), dtype=numpy.uint8)
+		for invertedI in range(8):
+			decoded = self.decodeRound(decoded, 7-invertedI, pSeed, seed)
+		seed = decoded ^ seed
+		seed[seed == 0] = 1
+		self.seed[:] = seed.tobytes()
+		return bytearray(decoded.tobytes())
+
 # TODO change general parameter policy: all parameters may be edited by functions, no deepcopy needed
 #TODO change to bytearray
 
@@ -489,6 +785,26 @@ class SBoxUnitTest(unittest.TestCase):
 		self.assertTrue(encodedMatches < 256/10)
 		self.assertTrue(decodedMatches == 256)
 
+	def test_schedule(self):
+		for size in [256, 2048]:
+			pw = bytearray()
+			for i in range(size):
+				pw.append(randint(0, 255))
+			pw[size-1] = 255
+			# walk the table to the targetEmpty-th empty slot
+			expected = [-1]*size
+			index = 0
+			for i in range(size):
+				emptyCounter = 0
+				targetEmpty = 1+(pw[i]%(size-i))
+				while (emptyCounter < targetEmpty):
+					if (expected[index] == -1):
+						emptyCounter += 1
+					if (emptyCounter < targetEmpty):
+						index = (index+1)%size
+				expected[index] = i
+			self.assertTrue(keySchedule(pw, size) == expected)
+
 class PBoxUnitTest(unittest.TestCase):
 	def setUp(self):
 		self.pw = bytearray()
@@ -517,6 +833,20 @@ class PBoxUnitTest(unittest.TestCase):
 			self.assertTrue(encodedMatches < 256/10)
 			self.assertTrue(decodedMatches == 256)
 
+	def test_bits(self):
+		plain = bytearray()
+		for i in range(256):
+			plain.append(randint(0, 255))
+		for seed in [0, 1, 7, 8, 255]:
+			# every set bit moves to the target of its rotated position
+			expected = bytearray(256)
+			for i in range(256):
+				for b in range(8):
+					if ((plain[i]) & (1<<b)):
+						index = self.pBox.encodeMap[(i*8+b+seed)%2048]
+						expected[index//8] |= 1<<(index%8)
+			self.assertTrue(self.pBox.encode(plain, seed) == expected)
+
 class SPBoxUnitTest(unittest.TestCase):
 	def setUp(self):
 		self.pw = bytearray()
@@ -552,4 +882,83 @@ class SPBoxUnitTest(unittest.TestCase):
 				decodedMatches += 1
 		self.assertTrue(decodedMatches == length)  # TODO encodeMatches
 		self.assertTrue(seedMatches < 256/10)
-# TODO encode 2nd batch#plain is edited
\ No newline at end of file
+
+	def test_tables(self):
+		plain = bytearray()
+		for i in range(256):
+			plain.append(randint(0, 255))
+		for round in range(8):
+			# substitution of every byte by the SBoxes of its seed bits
+			expected = bytearray(256)
+			for i in range(256):
+				seedAtI = self.spBox.seed[i]
+				expected[i] = plain[i] ^ self.spBox.sBoxes[round].encodeMap[i] ^ seedAtI
+				for j in range(8):
+					if ((seedAtI & (1<<j)) != 0):
+						expected[i] = self.spBox.sBoxes[j].encodeMap[expected[i]]
+			encoded = self.spBox.encodeRound(plain, round, 0)
+			self.assertTrue(encoded == self.spBox.pBox.encode(expected, 0))
+			self.assertTrue(self.spBox.decodeRound(encoded, round, 0) == plain)
+		for s in range(256):
+			for x in range(256):
+				self.assertTrue(self.spBox.decodeTables[s][self.spBox.encodeTables[s][x]] == x)
+# TODO encode 2nd batch#plain is edited
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class NumpySPBoxUnitTest(unittest.TestCase):
+	def setUp(self):
+		self.pw = bytearray()
+		for i in range(4096):
+			self.pw.append(randint(0, 255))
+		self.spBox = SPBox(self.pw)
+		self.numpySPBox = NumpySPBox(self.pw, self.spBox.getSeed())
+
+	def tearDown(self):
+		self.pw = None
+		self.spBox = None
+		self.numpySPBox = None
+
+	def test_parity(self):
+		seed = self.spBox.getSeed()
+		blocks = []
+		for b in range(4):
+			plain = bytearray()
+			for i in range(256):
+				plain.append(randint(0, 255))
+			blocks.append(plain)
+		encodedBlocks = []
+		for plain in blocks:
+			encoded = self.spBox.encode(bytearray(plain))
+			self.assertTrue(self.numpySPBox.encode(bytearray(plain)) == encoded)
+			self.assertTrue(self.numpySPBox.getSeed() == self.spBox.getSeed())
+			encodedBlocks.append(encoded)
+		self.spBox.setSeed(seed)
+		self.numpySPBox.setSeed(seed)
+		for b in range(4):
+			decoded = self.numpySPBox.decode(bytearray(encodedBlocks[b]))
+			self.assertTrue(decoded == blocks[b])
+			self.assertTrue(self.spBox.decode(bytearray(encodedBlocks[b])) == decoded)
+
+class EncoderUnitTest(unittest.TestCase):
+	def setUp(self):
+		fin = open("../test.txt", "rb")
+		self.plain = fin.read(100000)
+		fin.close()
+
+	def tearDown(self):
+		self.plain = None
+
+	def test_chunks(self):
+		encoder = Encoder("password")
+		decoder = Decoder("password")
+		encoded = bytearray()
+		offset = 0
+		for size in [1, 255, 256, 1000, 300]:
+			encoded += encoder.encode(bytearray(self.plain[offset:offset+size]))
+			offset += size
+		encoded += encoder.encode(bytearray(self.plain[offset:]))
+		encoded += encoder.close()
+		self.assertTrue(len(encoded) == 256+(len(self.plain)+255)//256*256)
+		decoded = decoder.decode(memoryview(encoded)[:1000])
+		decoded += decoder.decode(memoryview(encoded)[1000:])
+		self.assertTrue(decoded[:len(self.plain)] == self.plain)
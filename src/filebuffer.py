@@ -1,7 +1,13 @@
 import os
+import errno
+import mmap
+import io
 import unittest
 from random import randint
 import shutil
+from typing import BinaryIO, List, Optional, Set, Union
+
+IOV_MAX = 1024
 
 
 class ReadBuffer:
@@ -12,36 +18,68 @@ class ReadBuffer:
 		fIn: filereference
 		bufferSize: size of the buffer
 		buffer: buffer
+		view: memoryview of the buffer
 		bufferPos: startposition of the buffer in the open file
+		bufferLength: number of valid bytes in the buffer
 		pos: position of the cursor in the open file
-		filesize: size of the open file
+		filesize: size of the open file, -1 if unknown
+		ownsFile: status if the file is closed by close
 
 	Parameters:
-		infile: path to file
+		infile: path to file or a binary stream such as sys.stdin.buffer
 		buffersize: size of the buffer
 
 	| **Pre:**
-	|	os.path.isfile(inFile)
+	|	os.path.isfile(inFile) or inFile is a readable binary stream
 	|	bufferSize > 0
 
 	| **Post:**
 	|	self.fIn is open
-	|	len(self.buffer) >= 0
-	|	len(self.buffer) <= self.bufferSize
-	|	isinstance(self.buffer[i], int)
-	|	self.buffer[i] >= 0
-	|	self.buffer[i] < 256
+	|	len(self.buffer) == self.bufferSize
+	|	self.bufferLength >= 0
+	|	self.bufferLength <= self.bufferSize
 	|	self.bufferPos == 0
 	|	self.pos == 0
-	|	self.filesize == os.stat(inFile).st_size
+	|	self.filesize == os.stat(inFile).st_size or self.filesize == -1
+
+	Note:
+		Streams are read until their end and can not be seeked.
 	"""
-	def __init__(self, infile: str, buffersize: int=1024):
-		self.fIn = open(infile, "rb")#TODO type
+	def __init__(self, infile: Union[str, BinaryIO], buffersize: int=64*1024):
+		self.ownsFile: bool = isinstance(infile, str)
+		if self.ownsFile:
+			self.fIn = open(infile, "rb", buffering=0)
+			self.filesize: int = os.fstat(self.fIn.fileno()).st_size
+		else:
+			self.fIn = infile
+			self.filesize: int = -1
 		self.bufferSize: int = buffersize
-		self.buffer: bytearray = self.fIn.read(self.bufferSize)
+		self.buffer: bytearray = bytearray(self.bufferSize)
+		self.view: memoryview = memoryview(self.buffer)
 		self.bufferPos: int = 0
+		self.bufferLength: int = 0
 		self.pos: int = 0
-		self.filesize: int = os.stat(infile).st_size
+		self.fill()
+
+	def fill(self):
+		"""
+		Refills the buffer starting at the cursorposition.
+
+		| **Pre:**
+		|	self.fIn is open
+
+		| **Post:**
+		|	self.bufferPos == self.pos
+		|	self.bufferLength == 0 if the end of the file is reached
+
+		| **Modifies:**
+		|	self.bufferPos
+		|	self.bufferLength
+		|	self.buffer[i]
+		|	self.fIn
+		"""
+		self.bufferPos = self.pos
+		self.bufferLength = self.fIn.readinto(self.buffer) or 0
 
 	def seek(self, pos: int):
 		"""
@@ -56,17 +94,22 @@ class ReadBuffer:
 		|	self.fIn is open
 
 		| **Post:**
-		|	self.bufferPos = pos
+		|	self.pos = pos
 
 		| **Modifies:**
 		|	self.bufferPos
+		|	self.bufferLength
 		|	self.buffer[i]
+		|	self.pos
 		|	self.fIn
+
+		Note:
+			The file is only touched if pos lies outside of the buffer.
 		"""
-		self.bufferPos = pos
 		self.pos = pos
-		self.fIn.seek(pos)
-		self.buffer = self.fIn.read(self.bufferSize)
+		if pos < self.bufferPos or pos > self.bufferPos+self.bufferLength:
+			self.fIn.seek(pos)
+			self.fill()
 
 	def read(self, size: int=1024) -> bytearray:
 		"""
@@ -80,41 +123,99 @@ class ReadBuffer:
 
 		| **Pre:**
 		|	size > 0
-		|	size <= self.bufferSize
 		|	self.fIn is open
 
 		| **Post:**
 		|	len(return) >= 0
 		|	len(return) <= size
+		|	len(return) < size only if the end of the file is reached
+		|	self.pos <= self.filesize or self.filesize == -1
 		|	isinstance(return[i], int)
 		|	return[i] >= 0
 		|	return[i] < 256
 
 		| **Modifies:**
 		|	self.bufferPos
+		|	self.bufferLength
 		|	self.buffer[i]
 		|	self.pos
 		|	self.fIn
+
+		Note:
+			Reads larger than the buffer are read directly into the returned bytearray.
+			Files are read up to the size they had when they were opened, even if they grow meanwhile.
 		"""
-		ba = bytearray()
-		if self.pos+size > self.filesize:
-			size = self.filesize-self.pos
-		if size == 0:
-			return ba
-		if self.pos+size > self.bufferPos+self.bufferSize:
-			for i in range(self.bufferPos+self.bufferSize-self.pos):
-				ba.append(self.buffer[i+self.pos-self.bufferPos])
-				size -= 1
-			self.seek(self.bufferPos+self.bufferSize)  # TODO ensure buffer contains all data (size<=bufferSize)
-			for i in range(self.pos+size-self.bufferPos):
-				#print(self.pos+size-self.bufferPos)
-				ba.append(self.buffer[i])
+		if self.filesize >= 0:
+			size = min(size, self.filesize-self.pos)
+		offset = self.pos-self.bufferPos
+		available = self.bufferLength-offset
+		if size <= available:
+			self.pos += size
+			return bytearray(self.view[offset:offset+size])
+		ba = bytearray(size)
+		ba[:available] = self.view[offset:self.bufferLength]
+		self.pos += available
+		filled = available
+		if size-filled >= self.bufferSize:
+			view = memoryview(ba)
+			while filled < size:
+				length = self.fIn.readinto(view[filled:])
+				if not length:
+					break
+				filled += length
+			view.release()
+			self.pos += filled-available
+			self.bufferPos = self.pos
+			self.bufferLength = 0
 		else:
-			for i in range(size):
-				ba.append(self.buffer[i+self.pos-self.bufferPos])
-		self.pos = self.pos+size
+			while filled < size:
+				self.fill()
+				if self.bufferLength == 0:
+					break
+				length = min(size-filled, self.bufferLength)
+				ba[filled:filled+length] = self.view[:length]
+				filled += length
+				self.pos += length
+		if filled < size:
+			del ba[filled:]
 		return ba
 
+	def readview(self, size: int=1024) -> memoryview:
+		"""
+		Reads data from file without copying it if possible.
+
+		Parameters:
+			size: max number of bytes to be read
+
+		Returns:
+			read bytes
+
+		| **Pre:**
+		|	size > 0
+		|	self.fIn is open
+
+		| **Post:**
+		|	len(return) >= 0
+		|	len(return) <= size
+
+		| **Modifies:**
+		|	self.bufferPos
+		|	self.bufferLength
+		|	self.buffer[i]
+		|	self.pos
+		|	self.fIn
+
+		Note:
+			The returned memoryview may point into self.buffer and is only valid until the next call.
+		"""
+		if self.filesize >= 0:
+			size = min(size, self.filesize-self.pos)
+		offset = self.pos-self.bufferPos
+		if size <= self.bufferLength-offset:
+			self.pos += size
+			return self.view[offset:offset+size]
+		return memoryview(self.read(size))
+
 	def close(self):
 		"""
 		Closes the file.
@@ -122,58 +223,257 @@ class ReadBuffer:
 		| **Pre:**
 		|	self.fIn is open
 
+		| **Post:**
+		|	self.fIn is closed if self.ownsFile
+
+		| **Modifies:**
+		|	self.fIn
+		"""
+		if self.ownsFile:
+			self.fIn.close()
+
+
+class MMapReadBuffer:
+	"""
+	MMapReadBuffer reads files through a memory map without copying.
+
+	Attributes:
+		fIn: filereference
+		map: memory map of the open file
+		view: memoryview of the memory map
+		blockSize: alignment of the windows returned by readview
+		pos: position of the cursor in the open file
+		filesize: size of the open file
+
+	Parameters:
+		infile: path to file
+		blocksize: alignment of the windows returned by readview
+
+	| **Pre:**
+	|	os.path.isfile(inFile)
+	|	os.stat(inFile).st_size > 0
+	|	blocksize > 0
+
+	| **Post:**
+	|	self.fIn is open
+	|	len(self.view) == self.filesize
+	|	self.pos == 0
+	|	self.filesize == os.stat(inFile).st_size
+
+	Note:
+		Raises OSError or ValueError if the file can not be mapped.
+	"""
+	def __init__(self, infile: str, blocksize: int=256):
+		self.fIn = open(infile, "rb")
+		try:
+			self.filesize: int = os.fstat(self.fIn.fileno()).st_size
+			self.map: mmap.mmap = mmap.mmap(self.fIn.fileno(), 0, access=mmap.ACCESS_READ)
+		except (OSError, ValueError):
+			self.fIn.close()
+			raise
+		self.view: memoryview = memoryview(self.map)
+		self.blockSize: int = blocksize
+		self.pos: int = 0
+
+	def seek(self, pos: int):
+		"""
+		Changes the cursorposition within a file.
+
+		Parameters:
+			pos: position
+
+		| **Pre:**
+		|	pos >= 0
+		|	pos <= self.fileSize
+
+		| **Post:**
+		|	self.pos = pos
+
+		| **Modifies:**
+		|	self.pos
+		"""
+		self.pos = pos
+
+	def readview(self, size: int=1024) -> memoryview:
+		"""
+		Returns a window of the file without copying it.
+
+		Parameters:
+			size: number of bytes to be read, rounded up to a multiple of self.blockSize
+
+		Returns:
+			read bytes
+
+		| **Pre:**
+		|	size > 0
+
+		| **Post:**
+		|	len(return) >= 0
+		|	len(return)%self.blockSize == 0 or the end of the file is reached
+
+		| **Modifies:**
+		|	self.pos
+
+		Note:
+			The windows start at multiples of self.blockSize as long as self.pos did.
+		"""
+		size = -(-size//self.blockSize)*self.blockSize
+		start = self.pos
+		self.pos = min(start+size, self.filesize)
+		return self.view[start:self.pos]
+
+	def read(self, size: int=1024) -> bytearray:
+		"""
+		Reads data from file.
+
+		Parameters:
+			size: max number of bytes to be read
+
+		Returns:
+			read bytes
+
+		| **Pre:**
+		|	size > 0
+
+		| **Post:**
+		|	len(return) >= 0
+		|	len(return) <= size
+
+		| **Modifies:**
+		|	self.pos
+		"""
+		start = self.pos
+		self.pos = min(start+size, self.filesize)
+		return bytearray(self.view[start:self.pos])
+
+	def close(self):
+		"""
+		Unmaps and closes the file.
+
 		| **Post:**
 		|	self.fIn is closed
 
 		| **Modifies:**
+		|	self.map
 		|	self.fIn
+
+		Note:
+			The memory map stays alive as long as windows returned by readview are referenced.
 		"""
+		self.view.release()
+		try:
+			self.map.close()
+		except BufferError:
+			pass
 		self.fIn.close()
 
 
+def openReadBuffer(infile: str, buffersize: int=64*1024, useMMap: bool=True) -> Union[MMapReadBuffer, ReadBuffer]:
+	"""
+	Opens a file for reading, preferring a memory map.
+
+	Parameters:
+		infile: path to file
+		buffersize: size of the buffer if the file can not be mapped
+		useMMap: status if a memory map should be tried
+
+	Returns:
+		MMapReadBuffer or ReadBuffer if the file can not be mapped
+
+	| **Pre:**
+	|	os.path.isfile(inFile)
+	"""
+	if useMMap:
+		try:
+			return MMapReadBuffer(infile)
+		except (OSError, ValueError):
+			pass
+	return ReadBuffer(infile, buffersize)
+
+
 class WriteBuffer:
 	"""
 	WriteBuffer buffers writing of files.
 
 	Attributes:
 		fOut: filereference
-		bufferSize: size of the buffer
+		bufferSize: size of the buffer, the buffer is flushed once it is exceeded
 		buffer: buffer
+		chunks: buffered chunks if vectored writes are used
 		size: actual size of the buffer
+		vectored: status if buffered chunks are written with os.writev
+		bytesWritten: number of bytes handed to write
+		flushes: number of times the buffer was written to the file
+		fd: filedescriptor of the file, None if the stream has none
+		ownsFile: status if the file is closed by close
+		preallocated: number of bytes reserved for the file when it was opened
 
 	Parameters:
-		outfile: path to file
+		outfile: path to file or a binary stream such as sys.stdout.buffer
 		buffersize: size of the buffer
+		vectored: status if buffered chunks are written with os.writev instead of being copied into one buffer
+		folders: folders known to exist, shared between writeBuffers to skip checking them again
+		preallocate: expected size of the file, the space is reserved before anything is written
 
 	| **Pre:**
-	|	os.path.isfile(outFile)
+	|	os.path.isfile(outFile) or outFile is a writable binary stream
 	|	self.bufferSize > 0
 
 	| **Post:**
 	|	self.fOut is open
-	|	len(self.buffer) >= 0
-	|	len(self.buffer) <= self.bufferSize
-	|	isinstance(self.buffer[i], int)
-	|	self.buffer[i] >= 0
-	|	self.buffer[i] < 256
+	|	len(self.buffer) == 0
+	|	len(self.chunks) == 0
+	|	self.bytesWritten == 0
+	|	self.flushes == 0
 	|	folders above outFile are created
 
 	Note:
 		self.size might be bigger sometimes than self.bufferSize
+		vectored falls back to a single buffer if os.writev is not available
+		streams are flushed but not closed by close
+		preallocate uses os.posix_fallocate, so a full disk raises OSError with ENOSPC before any data is written.
+		It is skipped for streams, on systems without posix_fallocate and on filesystems that do not support it.
+		If less than the reserved space is written, close truncates the file to the written size.
 	"""
 
-	def __init__(self, outfile, buffersize=1024):
-		self.bufferSize = buffersize
-		self.buffer = bytearray()
-		self.size = 0
-		index = outfile.rfind("/")
-		if index != -1:
-			folder = outfile[:index]
-			if not os.path.exists(folder):
-				os.makedirs(folder)
-		self.fOut = open(outfile, "wb")
-
-	def write(self, data: bytearray):
+	def __init__(self, outfile: Union[str, BinaryIO], buffersize: int=4*1024*1024, vectored: bool=False, folders: Set[str]=None, preallocate: int=0):
+		self.bufferSize: int = buffersize
+		self.buffer: bytearray = bytearray()
+		self.chunks: List[bytes] = []
+		self.size: int = 0
+		self.bytesWritten: int = 0
+		self.flushes: int = 0
+		self.ownsFile: bool = isinstance(outfile, str)
+		if self.ownsFile:
+			index = outfile.rfind("/")
+			if index != -1:
+				folder = outfile[:index]
+				if folders is None:
+					if not os.path.exists(folder):
+						os.makedirs(folder)
+				elif folder not in folders:
+					os.makedirs(folder, exist_ok=True)
+					folders.add(folder)
+			self.fOut = open(outfile, "wb", buffering=0)
+		else:
+			self.fOut = outfile
+			self.fOut.flush()
+		try:
+			self.fd: Optional[int] = self.fOut.fileno()
+		except (OSError, ValueError):
+			self.fd: Optional[int] = None
+		self.vectored: bool = vectored and hasattr(os, "writev") and self.fd is not None
+		self.preallocated: int = 0
+		if preallocate > 0 and self.ownsFile and hasattr(os, "posix_fallocate"):
+			try:
+				os.posix_fallocate(self.fd, 0, preallocate)
+				self.preallocated = preallocate
+			except OSError as e:
+				if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+					self.fOut.close()
+					raise
+
+	def write(self, data: Union[bytes, bytearray, memoryview]):
 		"""
 		Writes data into buffer and file.
 
@@ -181,8 +481,7 @@ class WriteBuffer:
 			data: data to be written
 
 		| **Pre:**
-		|	self.fIn is open
-		|	len(data) > 0
+		|	self.fOut is open
 		|	isinstance(data[i], int)
 		|	data[i] >= 0
 		|	data[i] < 256
@@ -190,15 +489,80 @@ class WriteBuffer:
 		| **Modifies:**
 		|	self.size
 		|	self.buffer[i]
+		|	self.chunks
+		|	self.bytesWritten
 		|	self.fOut
+
+		Note:
+			data may be modified by the caller after the call.
 		"""
-		for d in data:
-			self.buffer.append(d)
-		self.size += len(data)
+		length = len(data)
+		if length == 0:
+			return
+		if self.vectored:
+			if not isinstance(data, bytes):
+				data = bytes(data)
+			self.chunks.append(data)
+		else:
+			self.buffer += data
+		self.size += length
+		self.bytesWritten += length
 		if self.size > self.bufferSize:
-			self.fOut.write(self.buffer)
-			self.size = 0
+			self.flush()
+
+	def flush(self):
+		"""
+		Writes the buffer into the file.
+
+		| **Pre:**
+		|	self.fOut is open
+
+		| **Post:**
+		|	self.size == 0
+
+		| **Modifies:**
+		|	self.size
+		|	self.buffer[i]
+		|	self.chunks
+		|	self.flushes
+		|	self.fOut
+		"""
+		if self.size == 0:
+			return
+		if self.vectored:
+			chunks = self.chunks
+			self.chunks = []
+			while len(chunks) > 0:
+				batch = chunks[:IOV_MAX]
+				written = os.writev(self.fd, batch)
+				del chunks[:len(batch)]
+				batchLength = sum(len(chunk) for chunk in batch)
+				if written < batchLength:
+					rest = b"".join(batch)[written:]
+					self.writeAll(rest)
+		else:
+			self.writeAll(self.buffer)
 			self.buffer = bytearray()
+		self.size = 0
+		self.flushes += 1
+
+	def writeAll(self, data: Union[bytes, bytearray]):
+		"""
+		Writes data into the file, retrying after partial writes.
+
+		Parameters:
+			data: data to be written
+
+		| **Modifies:**
+		|	self.fOut
+		"""
+		if self.fd is None:
+			self.fOut.write(data)
+			return
+		view = memoryview(data)
+		while len(view) > 0:
+			written = os.write(self.fd, view)
+			view = view[written:]
 
 	def close(self):
 		"""
@@ -208,13 +572,16 @@ class WriteBuffer:
 		|	self.fOut is open
 
 		| **Post:**
-		|	self.fOut is closed
+		|	self.fOut is closed if self.ownsFile
 
 		| **Modifies:**
 		|	self.fOut
 		"""
-		self.fOut.write(self.buffer)
-		self.fOut.close()
+		self.flush()
+		if self.ownsFile:
+			if self.bytesWritten < self.preallocated:
+				os.ftruncate(self.fd, self.fOut.tell())
+			self.fOut.close()
 
 	def seek(self, pos: int):
 		"""
@@ -225,17 +592,16 @@ class WriteBuffer:
 
 		| **Pre:**
 		|	pos >= 0
-		|	self.fIn is open
+		|	self.fOut is open
 
 		| **Post:**
-		|	self.buffer = bytearray()
+		|	self.size == 0
 
 		| **Modifies:**
 		|	self.fOut
 		|	self.buffer[i]
 		"""
-		self.fOut.write(self.buffer)
-		self.buffer = bytearray()
+		self.flush()
 		self.fOut.seek(pos)  # TODO preconditions
 
 class FileBufferUnitTest(unittest.TestCase):
@@ -285,4 +651,129 @@ class FileBufferUnitTest(unittest.TestCase):
 			self.assertTrue(ba1[i] == ba2[i])
 		fin1.close()
 		fin2.close()
-		shutil.rmtree(testfolder)
\ No newline at end of file
+		shutil.rmtree(testfolder)
+
+	def test_vectored(self):
+		testfolder = "../test"
+		dstfile = "../test/test.vectored.txt"
+		fin = open(self.srcfile, "rb")
+		ba = fin.read()
+		fin.close()
+		writebuffer = WriteBuffer(dstfile, 10000, True)
+		view = memoryview(ba)
+		pos = 0
+		while pos < len(ba):
+			size = randint(1, 3000)
+			writebuffer.write(view[pos:pos+size])
+			pos += size
+		writebuffer.write(bytearray(b"end"))
+		writebuffer.close()
+		self.assertTrue(writebuffer.bytesWritten == len(ba)+3)
+		self.assertTrue(writebuffer.flushes > 1)
+		self.assertTrue(writebuffer.flushes <= (len(ba)+3)//10000+1)
+		fin = open(dstfile, "rb")
+		self.assertTrue(fin.read() == ba+b"end")
+		fin.close()
+		shutil.rmtree(testfolder)
+
+	def test_preallocate(self):
+		testfolder = "../test"
+		dstfile = "../test/test.preallocated.txt"
+		fin = open(self.srcfile, "rb")
+		ba = fin.read()
+		fin.close()
+		for size in [len(ba), len(ba)+5000]:
+			writebuffer = WriteBuffer(dstfile, 10000, preallocate=size)
+			for pos in range(0, len(ba), 3000):
+				writebuffer.write(ba[pos:pos+3000])
+			writebuffer.close()
+			self.assertTrue(os.stat(dstfile).st_size == len(ba))
+			fin = open(dstfile, "rb")
+			self.assertTrue(fin.read() == ba)
+			fin.close()
+		shutil.rmtree(testfolder)
+
+	def test_largeread(self):
+		readbuffer = ReadBuffer(self.srcfile, 100)
+		filesize = os.stat(self.srcfile).st_size
+		fin = open(self.srcfile, "rb")
+		ba = fin.read(filesize)
+		fin.close()
+		pos = 0
+		for size in [1, 99, 100, 101, 250, 1000, 4096]:
+			data = readbuffer.read(size)
+			self.assertTrue(data == ba[pos:pos+size])
+			pos += size
+		readbuffer.seek(pos-50)
+		self.assertTrue(bytes(readbuffer.readview(150)) == ba[pos-50:pos+100])
+		data = readbuffer.read(filesize)
+		self.assertTrue(data == ba[pos+100:])
+		self.assertTrue(len(readbuffer.read(1)) == 0)
+		readbuffer.close()
+
+	def test_mmap(self):
+		filesize = os.stat(self.srcfile).st_size
+		fin = open(self.srcfile, "rb")
+		ba = fin.read(filesize)
+		fin.close()
+		readbuffer = openReadBuffer(self.srcfile)
+		self.assertTrue(isinstance(readbuffer, MMapReadBuffer))
+		pos = 0
+		while True:
+			view = readbuffer.readview(1000)
+			if len(view) == 0:
+				break
+			self.assertTrue(pos%256 == 0)
+			self.assertTrue(len(view)%256 == 0 or pos+len(view) == filesize)
+			self.assertTrue(view == ba[pos:pos+len(view)])
+			pos += len(view)
+		self.assertTrue(pos == filesize)
+		readbuffer.seek(10)
+		self.assertTrue(readbuffer.read(5) == ba[10:15])
+		readbuffer.close()
+		testfolder = "../test"
+		emptyfile = "../test/empty"
+		writebuffer = WriteBuffer(emptyfile)
+		writebuffer.close()
+		readbuffer = openReadBuffer(emptyfile)
+		self.assertTrue(isinstance(readbuffer, ReadBuffer))
+		self.assertTrue(len(readbuffer.readview()) == 0)
+		readbuffer.close()
+		shutil.rmtree(testfolder)
+
+	def test_growing(self):
+		testfolder = "../test"
+		os.makedirs(testfolder)
+		growingfile = "../test/growing"
+		fout = open(growingfile, "wb")
+		fout.write(bytes(5000))
+		fout.flush()
+		readbuffer = ReadBuffer(growingfile, 1000)
+		fout.write(bytes(3000))
+		fout.close()
+		self.assertTrue(len(readbuffer.read(4000)) == 4000)
+		self.assertTrue(len(readbuffer.readview(4000)) == 1000)
+		self.assertTrue(len(readbuffer.read(4000)) == 0)
+		readbuffer.seek(0)
+		self.assertTrue(len(readbuffer.read(8000)) == 5000)
+		readbuffer.close()
+		shutil.rmtree(testfolder)
+
+	def test_stream(self):
+		fin = open(self.srcfile, "rb")
+		ba = fin.read()
+		fin.seek(0)
+		readbuffer = ReadBuffer(fin, 1000)
+		out = io.BytesIO()
+		writebuffer = WriteBuffer(out, 5000)
+		while True:
+			data = readbuffer.readview(777)
+			if len(data) == 0:
+				break
+			writebuffer.write(data)
+		readbuffer.close()
+		writebuffer.close()
+		self.assertTrue(not fin.closed)
+		self.assertTrue(not out.closed)
+		fin.close()
+		self.assertTrue(out.getvalue() == ba)
\ No newline at end of file
@@ -0,0 +1,206 @@
+import os
+import unittest
+import shutil
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+STREAM = "-"
+
+
+class Entry:
+	"""
+	Entry describes a file found by the Manifest.
+
+	Attributes:
+		name: path of the file within the archive
+		size: size of the file
+		inode: device and inode of the file if it has more than one hard link, None otherwise
+		mtime: time of the last modification in nanoseconds
+
+	Parameters:
+		name: path of the file within the archive
+		size: size of the file
+		inode: device and inode of the file if it has more than one hard link, None otherwise
+		mtime: time of the last modification in nanoseconds
+	"""
+	def __init__(self, name: str, size: int, inode: Tuple[int, int]=None, mtime: int=0):
+		self.name: str = name
+		self.size: int = size
+		self.inode: Optional[Tuple[int, int]] = inode
+		self.mtime: int = mtime
+
+
+def createEntry(name: str, stat: os.stat_result) -> Entry:
+	"""
+	Creates the entry of a file from its stat result.
+
+	Parameters:
+		name: path of the file within the archive
+		stat: stat result of the file
+
+	Returns:
+		entry of the file
+	"""
+	inode = (stat.st_dev, stat.st_ino) if stat.st_nlink > 1 else None
+	return Entry(name, stat.st_size, inode, stat.st_mtime_ns)
+
+
+class Manifest:
+	"""
+	Manifest walks a file/folder once and caches the files it finds.
+
+	Attributes:
+		folder: part of the path in front of the names within the archive
+		entries: found files that are not taken yet
+		folders: found folders that are not scanned yet
+		size: total size of all found files
+		count: number of all found files
+
+	Parameters:
+		path: path to file/folder or STREAM
+
+	| **Pre:**
+	|	os.path.isfile(path) or os.path.isdir(path) or path == STREAM
+
+	| **Post:**
+	|	self.entries contains path if it is a file or STREAM
+	|	self.folders contains path if it is a folder
+
+	Note:
+		Folders are scanned lazily with os.scandir, whose entries already know if they are files or folders,
+		so every file is stat'ed once and every folder is listed once, no matter if walk runs before next.
+		Files are returned in the order of their depth, like the breadth first walk of the Archiver before.
+		STREAM is an entry of size 0, because the size of stdin is unknown.
+	"""
+	def __init__(self, path: str):
+		self.folder: str = ""
+		self.entries: Deque[Entry] = deque()
+		self.folders: Deque[str] = deque()
+		self.size: int = 0
+		self.count: int = 0
+		index = path.rfind(os.sep)
+		if index != -1:
+			self.folder = path[:index+1]
+		if path == STREAM:
+			self.add(Entry(STREAM, 0))
+		elif os.path.isdir(path):
+			self.folders.append(path)
+		else:
+			self.add(createEntry(path[len(self.folder):], os.stat(path)))
+
+	def add(self, entry: Entry):
+		"""
+		Adds a found file.
+
+		Parameters:
+			entry: found file
+
+		| **Modifies:**
+		|	self.entries
+		|	self.size
+		|	self.count
+		"""
+		self.entries.append(entry)
+		self.size += entry.size
+		self.count += 1
+
+	def scan(self) -> bool:
+		"""
+		Scans the next folder.
+
+		Returns:
+			False if all folders are scanned
+
+		| **Modifies:**
+		|	self.entries
+		|	self.folders
+		"""
+		if len(self.folders) == 0:
+			return False
+		folder = self.folders.popleft()
+		with os.scandir(folder) as iterator:
+			for dirEntry in iterator:
+				if dirEntry.is_dir():
+					self.folders.append(dirEntry.path)
+				elif dirEntry.is_file():
+					self.add(createEntry(dirEntry.path[len(self.folder):], dirEntry.stat()))
+		return True
+
+	def walk(self) -> int:
+		"""
+		Scans all folders.
+
+		Returns:
+			total size of all files
+
+		| **Post:**
+		|	len(self.folders) == 0
+		"""
+		while self.scan():
+			pass
+		return self.size
+
+	def next(self) -> Optional[Entry]:
+		"""
+		Takes the next file, scanning folders until one is found.
+
+		Returns:
+			next file, None if all files are taken
+
+		| **Modifies:**
+		|	self.entries
+		|	self.folders
+		"""
+		while len(self.entries) == 0:
+			if not self.scan():
+				return None
+		return self.entries.popleft()
+
+
+class ManifestUnitTest(unittest.TestCase):
+	def setUp(self):
+		pass
+
+	def tearDown(self):
+		pass
+
+	def test_walk(self):
+		testfolder = "../test"
+		os.makedirs("../test/folder/sub/subsub")
+		os.makedirs("../test/folder/empty")
+		files = {"folder/a.txt": 3, "folder/sub/b.txt": 5, "folder/sub/subsub/c.txt": 0, "folder/sub/d.txt": 7}
+		for name in files:
+			fout = open(testfolder+os.sep+name.replace("/", os.sep), "wb")
+			fout.write(bytes(files[name]))
+			fout.close()
+		manifest = Manifest("../test/folder")
+		self.assertTrue(manifest.walk() == 15)
+		self.assertTrue(manifest.count == 4)
+		names = []
+		while True:
+			entry = manifest.next()
+			if entry is None:
+				break
+			self.assertTrue(entry.size == files[entry.name.replace(os.sep, "/")])
+			names.append(entry.name.replace(os.sep, "/"))
+		self.assertTrue(sorted(names) == sorted(files))
+		self.assertTrue(names.index("folder/a.txt") < names.index("folder/sub/b.txt") < names.index("folder/sub/subsub/c.txt"))
+		lazy = Manifest("../test/folder")
+		self.assertTrue(lazy.next().name.replace(os.sep, "/") == "folder/a.txt")
+		self.assertTrue(len(lazy.folders) == 2)
+		single = Manifest("../test/folder/a.txt")
+		self.assertTrue(single.walk() == 3)
+		self.assertTrue(single.next().name == "a.txt")
+		self.assertTrue(single.next() is None)
+		self.assertTrue(Manifest(STREAM).next().name == STREAM)
+		os.link("../test/folder/a.txt", "../test/folder/link.txt")
+		inodes = {}
+		linked = Manifest("../test/folder")
+		while True:
+			entry = linked.next()
+			if entry is None:
+				break
+			inodes[os.path.basename(entry.name)] = entry.inode
+		self.assertTrue(inodes["a.txt"] is not None and inodes["a.txt"] == inodes["link.txt"])
+		self.assertTrue(inodes["b.txt"] is None)
+		shutil.rmtree(testfolder)
@@ -0,0 +1,246 @@
+import queue
+import threading
+import unittest
+from typing import Callable, List, Union
+
+Data = Union[bytes, bytearray, memoryview]
+
+END = None
+
+
+class Stage:
+	"""
+	Stage is a step of a pipeline that converts bytearrays.
+
+	Attributes:
+		process: converts a chunk of data
+		close: returns the data that is left when the input ends
+
+	Parameters:
+		process: converts a chunk of data
+		close: returns the data that is left when the input ends
+	"""
+	def __init__(self, process: Callable[[Data], bytearray], close: Callable[[], bytearray]):
+		self.process: Callable[[Data], bytearray] = process
+		self.close: Callable[[], bytearray] = close
+
+
+class Pipeline:
+	"""
+	Pipeline moves data from a source through stages into a sink.
+
+	Attributes:
+		source: returns the next chunk of data, an empty chunk ends the input
+		stages: stages the data passes in order
+		sink: consumes the converted data
+		queueSize: maximum number of chunks waiting in front of each stage
+		stopped: set if a worker failed
+		errors: exceptions raised by workers
+
+	Parameters:
+		source: returns the next chunk of data, an empty chunk ends the input
+		stages: stages the data passes in order
+		sink: consumes the converted data
+		queuesize: maximum number of chunks waiting in front of each stage
+
+	| **Pre:**
+	|	queuesize > 0
+
+	Note:
+		The output of a stage is handed to the next stage before the stage is closed,
+		so run(False) and run(True) produce the same calls in the same order per stage.
+	"""
+	def __init__(self, source: Callable[[], Data], stages: List[Stage], sink: Callable[[Data], None], queuesize: int=16):
+		self.source: Callable[[], Data] = source
+		self.stages: List[Stage] = stages
+		self.sink: Callable[[Data], None] = sink
+		self.queueSize: int = queuesize
+		self.stopped: threading.Event = threading.Event()
+		self.errors: List[BaseException] = []
+
+	def run(self, threaded: bool=False):
+		"""
+		Processes all data.
+
+		Parameters:
+			threaded: status if source, stages and sink run in their own threads
+
+		| **Post:**
+		|	self.source returned an empty chunk
+		|	all stages are closed
+
+		Note:
+			Exceptions of workers are raised again in the calling thread.
+		"""
+		if threaded:
+			self.runThreaded()
+		else:
+			self.runSequential()
+
+	def runSequential(self):
+		"""
+		Processes all data in the calling thread.
+		"""
+		while True:
+			data = self.source()
+			if len(data) == 0:
+				break
+			for stage in self.stages:
+				data = stage.process(data)
+			self.sink(data)
+		data = bytearray()
+		for stage in self.stages:
+			if len(data) > 0:
+				data = stage.process(data)
+			tail = stage.close()
+			if len(tail) > 0:
+				data = data+tail
+		if len(data) > 0:
+			self.sink(data)
+
+	def runThreaded(self):
+		"""
+		Processes all data with one thread per source, stage and sink joined by bounded queues.
+
+		| **Post:**
+		|	all threads are finished
+		"""
+		queues = [queue.Queue(self.queueSize) for i in range(len(self.stages)+1)]
+		threads = [threading.Thread(target=self.work, args=(self.produce, None, queues[0]), name="source")]
+		for i in range(len(self.stages)):
+			threads.append(threading.Thread(target=self.work, args=(self.transform, self.stages[i], queues[i+1], queues[i]), name="stage"+str(i)))
+		threads.append(threading.Thread(target=self.work, args=(self.consume, None, None, queues[-1]), name="sink"))
+		for thread in threads:
+			thread.daemon = True
+			thread.start()
+		for thread in threads:
+			thread.join()
+		if len(self.errors) > 0:
+			raise self.errors[0]
+
+	def work(self, function: Callable, stage: Stage, outQueue: queue.Queue, inQueue: queue.Queue=None):
+		"""
+		Runs a worker and stops the pipeline if it fails.
+
+		Parameters:
+			function: worker
+			stage: stage of the worker
+			outQueue: queue the worker puts data into
+			inQueue: queue the worker takes data from
+		"""
+		try:
+			function(stage, outQueue, inQueue)
+		except BaseException as e:
+			self.errors.append(e)
+			self.stopped.set()
+
+	def put(self, outQueue: queue.Queue, data: Data):
+		"""
+		Puts data into a queue, waiting while it is full.
+
+		Parameters:
+			outQueue: queue
+			data: data
+
+		Returns:
+			False if the pipeline is stopped
+		"""
+		while not self.stopped.is_set():
+			try:
+				outQueue.put(data, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def get(self, inQueue: queue.Queue) -> Data:
+		"""
+		Takes data from a queue, waiting while it is empty.
+
+		Parameters:
+			inQueue: queue
+
+		Returns:
+			data, END if the input ends or the pipeline is stopped
+		"""
+		while not self.stopped.is_set():
+			try:
+				return inQueue.get(timeout=0.1)
+			except queue.Empty:
+				pass
+		return END
+
+	def produce(self, stage: Stage, outQueue: queue.Queue, inQueue: queue.Queue):
+		"""
+		Reads from the source until it is empty.
+		"""
+		while True:
+			data = self.source()
+			if len(data) == 0:
+				break
+			if not self.put(outQueue, data):
+				return
+		self.put(outQueue, END)
+
+	def transform(self, stage: Stage, outQueue: queue.Queue, inQueue: queue.Queue):
+		"""
+		Converts data with a stage until the input ends.
+		"""
+		while True:
+			data = self.get(inQueue)
+			if data is END:
+				break
+			data = stage.process(data)
+			if len(data) > 0 and not self.put(outQueue, data):
+				return
+		if self.stopped.is_set():
+			return
+		data = stage.close()
+		if len(data) > 0:
+			self.put(outQueue, data)
+		self.put(outQueue, END)
+
+	def consume(self, stage: Stage, outQueue: queue.Queue, inQueue: queue.Queue):
+		"""
+		Hands data to the sink until the input ends.
+		"""
+		while True:
+			data = self.get(inQueue)
+			if data is END:
+				break
+			self.sink(data)
+
+
+class PipelineUnitTest(unittest.TestCase):
+	def setUp(self):
+		self.srcfile = "../test.txt"
+
+	def tearDown(self):
+		pass
+
+	def run_pipeline(self, threaded: bool, stages: List[Stage]) -> bytearray:
+		fin = open(self.srcfile, "rb")
+		output = bytearray()
+		pipeline = Pipeline(lambda: bytearray(fin.read(1000)), stages, output.extend, 2)
+		pipeline.run(threaded)
+		fin.close()
+		return output
+
+	def test_threaded(self):
+		from compressor import Compressor, Decompressor
+		fin = open(self.srcfile, "rb")
+		ba = fin.read()
+		fin.close()
+		for threaded in [False, True]:
+			compressor = Compressor()
+			decompressor = Decompressor()
+			stages = [Stage(compressor.compress, compressor.close), Stage(decompressor.decompress, decompressor.close)]
+			output = self.run_pipeline(threaded, stages)
+			self.assertTrue(output == ba)
+
+	def test_error(self):
+		def fail(data):
+			raise ValueError("fail")
+		stages = [Stage(lambda data: data, bytearray), Stage(fail, bytearray)]
+		with self.assertRaises(ValueError):
+			self.run_pipeline(True, stages)
@@ -0,0 +1,210 @@
+import io
+import json
+import sys
+import threading
+import time
+import unittest
+from typing import Dict, List, TextIO
+
+TEXT = "text"
+JSON = "json"
+SILENT = "silent"
+MODES = [TEXT, JSON, SILENT]
+MEGABYTE = 1024*1024
+
+
+class Progress:
+	"""
+	Progress reports the bytes passed by the stages of a run at a fixed rate.
+
+	Attributes:
+		total: number of bytes the first stage passes in the whole run, 0 if unknown
+		stages: names of the stages, the first one measures the progress
+		mode: TEXT, JSON or SILENT
+		interval: seconds between two reports
+		stream: stream the reports are written to
+		counts: bytes passed by each stage
+		start: time of the start of the run
+		nextReport: time of the next report
+		lastReport: time of the last report
+		lastCounts: bytes passed by each stage until the last report
+		lock: prevents reports of different threads from mixing
+
+	Parameters:
+		total: number of bytes the first stage passes in the whole run, 0 if unknown
+		stages: names of the stages, the first one measures the progress
+		mode: TEXT, JSON or SILENT
+		interval: seconds between two reports
+		stream: stream the reports are written to, sys.stderr if None
+
+	| **Pre:**
+	|	len(stages) > 0
+	|	mode in MODES
+	|	interval >= 0
+
+	Note:
+		update only adds to a counter and compares the time, reports are formatted at most once per interval.
+		TEXT overwrites one line with the percentage, the remaining time and the MB/s of each stage.
+		JSON writes one object per line with the keys time, progress, eta and stages,
+		progress and eta are None if total is unknown.
+		SILENT never reports and its update returns right away.
+		Stages that depend on the input, like the ones of a decoded archive, are added with addStage.
+	"""
+	def __init__(self, total: int, stages: List[str], mode: str=TEXT, interval: float=0.5, stream: TextIO=None):
+		self.total: int = total
+		self.stages: List[str] = stages
+		self.mode: str = mode
+		self.interval: float = interval
+		self.stream: TextIO = stream if stream is not None else sys.stderr
+		self.counts: Dict[str, int] = {stage: 0 for stage in stages}
+		self.start: float = time.monotonic()
+		self.nextReport: float = self.start+interval
+		self.lastReport: float = self.start
+		self.lastCounts: Dict[str, int] = dict(self.counts)
+		self.lock: threading.Lock = threading.Lock()
+		if mode == SILENT:
+			self.nextReport = float("inf")
+
+	def addStage(self, stage: str):
+		"""
+		Adds a stage behind the known stages, for stages that are only known once the run started.
+
+		Parameters:
+			stage: name of the stage
+
+		| **Modifies:**
+		|	self.stages
+		|	self.counts
+		|	self.lastCounts
+		"""
+		with self.lock:
+			if stage not in self.counts:
+				self.stages.append(stage)
+				self.counts[stage] = 0
+				self.lastCounts[stage] = 0
+
+	def update(self, stage: str, count: int):
+		"""
+		Adds bytes passed by a stage and reports if the interval is over.
+
+		Parameters:
+			stage: name of the stage
+			count: number of bytes
+
+		| **Modifies:**
+		|	self.counts
+		"""
+		self.counts[stage] += count
+		if self.nextReport <= time.monotonic():
+			self.report()
+
+	def report(self, final: bool=False):
+		"""
+		Writes a report.
+
+		Parameters:
+			final: status if the run is finished
+
+		| **Modifies:**
+		|	self.nextReport
+		|	self.lastReport
+		|	self.lastCounts
+		"""
+		if self.mode == SILENT:
+			return
+		with self.lock:
+			now = time.monotonic()
+			self.nextReport = now+self.interval
+			elapsed = now-self.start
+			duration = now-self.lastReport if not final else elapsed
+			counts = dict(self.counts)
+			since = self.lastCounts if not final else {stage: 0 for stage in self.stages}
+			rates = {stage: (counts[stage]-since[stage])/duration if duration > 0 else 0.0 for stage in self.stages}
+			self.lastReport = now
+			self.lastCounts = counts
+			fraction = None
+			eta = None
+			done = counts[self.stages[0]]
+			if self.total > 0:
+				fraction = min(done/self.total, 1.0)
+				eta = elapsed*max(self.total-done, 0)/done if done > 0 else None
+				if final:
+					eta = 0.0
+			if self.mode == JSON:
+				stages = {stage: {"bytes": counts[stage], "rate": rates[stage]} for stage in self.stages}
+				self.stream.write(json.dumps({"time": elapsed, "progress": fraction, "eta": eta, "stages": stages, "done": final})+"\n")
+			else:
+				line = str(round(done/MEGABYTE, 1))+"MB" if fraction is None else str(round(fraction*1000)/10)+"% "+formatTime(eta)
+				for stage in self.stages:
+					line += " "+stage+" "+str(round(rates[stage]/MEGABYTE, 1))+"MB/s"
+				self.stream.write(line+("\n" if final else "\r"))
+			self.stream.flush()
+
+	def close(self):
+		"""
+		Writes the final report with the average rates of the whole run.
+		"""
+		self.report(True)
+
+
+def formatTime(seconds: float) -> str:
+	"""
+	Formats a duration.
+
+	Parameters:
+		seconds: duration, None if unknown
+
+	Returns:
+		duration as hh:mm:ss, --:--:-- if unknown
+	"""
+	if seconds is None:
+		return "--:--:--"
+	seconds = int(seconds)
+	return "%02d:%02d:%02d" % (seconds//3600, seconds//60%60, seconds%60)
+
+
+class ProgressUnitTest(unittest.TestCase):
+	def setUp(self):
+		pass
+
+	def tearDown(self):
+		pass
+
+	def test_json(self):
+		stream = io.StringIO()
+		progress = Progress(1000, ["read", "write"], JSON, 0, stream)
+		progress.update("read", 250)
+		progress.update("write", 100)
+		progress.close()
+		reports = [json.loads(line) for line in stream.getvalue().splitlines()]
+		self.assertTrue(len(reports) == 3)
+		self.assertTrue(reports[0]["progress"] == 0.25)
+		self.assertTrue(reports[-1]["done"])
+		self.assertTrue(reports[-1]["eta"] == 0.0)
+		self.assertTrue(reports[-1]["stages"]["write"]["bytes"] == 100)
+
+	def test_stages(self):
+		stream = io.StringIO()
+		progress = Progress(0, ["read"], TEXT, 3600, stream)
+		progress.addStage("compress")
+		progress.addStage("write")
+		progress.addStage("compress")
+		progress.update("compress", MEGABYTE)
+		progress.close()
+		self.assertTrue(progress.stages == ["read", "compress", "write"])
+		self.assertTrue(" compress " in stream.getvalue() and stream.getvalue().endswith(" write 0.0MB/s\n"))
+
+	def test_modes(self):
+		stream = io.StringIO()
+		progress = Progress(0, ["read"], TEXT, 3600, stream)
+		for i in range(1000):
+			progress.update("read", MEGABYTE)
+		self.assertTrue(stream.getvalue() == "")
+		progress.close()
+		self.assertTrue(stream.getvalue().startswith("1000.0MB read "))
+		stream = io.StringIO()
+		progress = Progress(100, ["read"], SILENT, 0, stream)
+		progress.update("read", 100)
+		progress.close()
+		self.assertTrue(stream.getvalue() == "")
+		self.assertTrue(formatTime(3725) == "01:02:05")